@@ -82,10 +82,11 @@ const logSchema = new mongoose.Schema({
 });
 
 // 创建索引以提高查询性能
+// 注意：channelId / ai_analyzed 的单字段索引已被 telethon/mongo_index_init.py
+// 维护的复合索引（最左前缀）覆盖并在那边主动删除；这里不能再声明，
+// 否则 Mongoose autoIndex 每次启动会把它们重建回来，形成删/建循环
 logSchema.index({ time: -1 });
-logSchema.index({ channelId: 1 });
 logSchema.index({ keywords: 1 });
-logSchema.index({ ai_analyzed: 1 });
 // AI 分析/计数触发常用查询：按用户过滤未分析消息，并结合清除冷却窗口
 // 复合索引可显著减少 count/find 扫描带来的 CPU/IO
 logSchema.index({ userId: 1, ai_analyzed: 1, ai_cleared_at: 1, time: -1 });
@@ -7,19 +7,101 @@ import sys
 import os
 import asyncio
 import json
-from telethon import TelegramClient
-from telethon.errors import SessionPasswordNeededError, FloodWaitError
+import logging
+
+# telethon 按需加载（import 会连带加载加密库，冷启动需数百毫秒），
+# 参数校验失败等早退路径不必支付这笔开销
+TelegramClient = None
+SessionPasswordNeededError = None
+FloodWaitError = None
+
+def load_telethon():
+    """首次调用时加载 telethon，后续调用直接返回"""
+    global TelegramClient, SessionPasswordNeededError, FloodWaitError
+    if TelegramClient is None:
+        from telethon import TelegramClient as _TelegramClient
+        from telethon.errors import (
+            SessionPasswordNeededError as _SessionPasswordNeededError,
+            FloodWaitError as _FloodWaitError,
+        )
+        TelegramClient = _TelegramClient
+        SessionPasswordNeededError = _SessionPasswordNeededError
+        FloodWaitError = _FloodWaitError
+
+# 调试日志输出到 stderr（不影响 stdout 的 JSON 输出）
+# 默认关闭，设置环境变量 LOGIN_HELPER_DEBUG=1 开启；
+# 关闭时 log_debug 直接短路返回，避免在登录关键路径上
+# 产生几十次字符串格式化 + stat/listdir 系统调用 + stderr 写入
+log = logging.getLogger("login_helper")
+_handler = logging.StreamHandler(sys.stderr)
+_handler.setFormatter(logging.Formatter("[DEBUG] %(message)s"))
+log.addHandler(_handler)
+log.setLevel(logging.DEBUG if os.environ.get("LOGIN_HELPER_DEBUG") else logging.INFO)
+DEBUG_ENABLED = log.isEnabledFor(logging.DEBUG)
+
+def log_debug(msg):
+    if DEBUG_ENABLED:
+        log.debug(msg)
+
+def tune_session_db(client):
+    """为 SQLite session 启用 WAL 模式，减少每次 commit 的 fsync 开销
+
+    默认的 DELETE journal 模式每次提交都要创建/同步/删除 journal 文件，
+    导致登录后需要额外等待文件落盘。WAL + synchronous=NORMAL 让提交
+    直接追加到 WAL 文件，无需 journal 文件的创建/删除往返。
+    """
+    try:
+        conn = getattr(client.session, '_conn', None)
+        if conn is None:
+            return
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+    except Exception:
+        # 非 SQLite session 或 PRAGMA 失败时不影响登录流程
+        pass
+
+def scan_session_dir(session_dir):
+    """一次 os.scandir 拿到目录下所有条目的 stat，返回 {文件名: stat}
+
+    替代多次 os.path.exists / os.stat / os.listdir（每次都是一个系统调用）；
+    目录不存在或不可读时返回 None。
+    """
+    try:
+        with os.scandir(session_dir) as it:
+            return {e.name: e.stat() for e in it}
+    except OSError:
+        return None
+
+def fsync_file(path):
+    """对单个文件执行 fsync（阻塞调用，应放在线程中执行）"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def emit(result):
+    """把结果以单行 JSON 输出到 stdout（调用方按行解析）
+
+    使用紧凑分隔符，省掉默认 ", " / ": " 的填充开销和字节数。
+    """
+    print(json.dumps(result, separators=(',', ':')), flush=True)
 
 async def check_login_status(session_path, api_id, api_hash):
     """检查登录状态"""
+    load_telethon()
     try:
         client = TelegramClient(session_path, api_id, api_hash)
         await client.connect()
-        
+        tune_session_db(client)
+
         if await client.is_user_authorized():
             me = await client.get_me()
             await client.disconnect()
-            print(json.dumps({
+            return {
                 'success': True,
                 'logged_in': True,
                 'user': {
@@ -28,48 +110,48 @@ async def check_login_status(session_path, api_id, api_hash):
                     'last_name': getattr(me, 'last_name', None),
                     'username': me.username
                 }
-            }))
+            }
         else:
             await client.disconnect()
-            print(json.dumps({
+            return {
                 'success': True,
                 'logged_in': False
-            }))
+            }
     except Exception as e:
-        print(json.dumps({
+        return {
             'success': False,
             'error': str(e)
-        }))
-
-async def send_code(phone, session_path, api_id, api_hash):
-    """发送验证码"""
-    import json as json_module
-    import sys
-    import os
-    
-    # 添加详细日志到 stderr（不影响 JSON 输出）
-    def log_debug(msg):
-        print(f"[DEBUG] {msg}", file=sys.stderr, flush=True)
-    
+        }
+
+async def send_code(phone, session_path, api_id, api_hash, skip_auth_check=False):
+    """发送验证码
+
+    skip_auth_check=True 时跳过 is_user_authorized()/get_me() 预检查
+    （各一次 RTT）。调用方刚用 check 命令确认过未登录时无需重复检查。
+    """
+    load_telethon()
     try:
         log_debug(f"=== 发送验证码流程 ===")
         log_debug(f"Session 路径: {session_path}")
         log_debug(f"手机号: {phone}")
-        
-        # 检查目录和文件
-        session_dir = os.path.dirname(session_path)
-        log_debug(f"Session 目录: {session_dir}")
-        log_debug(f"目录是否存在: {os.path.exists(session_dir)}")
-        if os.path.exists(session_dir):
-            log_debug(f"目录内容: {os.listdir(session_dir)}")
+
+        # 检查目录和文件（仅调试模式，单次 scandir 替代 exists+listdir）
+        if DEBUG_ENABLED:
+            session_dir = os.path.dirname(session_path)
+            entries = scan_session_dir(session_dir)
+            log_debug(f"Session 目录: {session_dir}")
+            log_debug(f"目录是否存在: {entries is not None}")
+            if entries is not None:
+                log_debug(f"目录内容: {sorted(entries)}")
         
         client = TelegramClient(session_path, api_id, api_hash)
         await client.connect()
-        
-        if await client.is_user_authorized():
+        tune_session_db(client)
+
+        if not skip_auth_check and await client.is_user_authorized():
             me = await client.get_me()
             await client.disconnect()
-            print(json.dumps({
+            return {
                 'success': True,
                 'already_logged_in': True,
                 'user': {
@@ -77,71 +159,63 @@ async def send_code(phone, session_path, api_id, api_hash):
                     'first_name': me.first_name,
                     'username': me.username
                 }
-            }))
-            return
-        
+            }
+
         log_debug(f"发送验证码请求...")
         result = await client.send_code_request(phone)
         await client.disconnect()
         log_debug(f"验证码已发送，phone_code_hash: {result.phone_code_hash}")
-        
-        print(json.dumps({
+
+        return {
             'success': True,
             'phone_code_hash': result.phone_code_hash
-        }))
+        }
     except FloodWaitError as e:
         log_debug(f"请求过于频繁，需等待 {e.seconds} 秒")
-        print(json.dumps({
+        return {
             'success': False,
             'error': f'请求过于频繁，请等待 {e.seconds} 秒后重试',
             'flood_wait': e.seconds
-        }))
+        }
     except Exception as e:
         import traceback
         log_debug(f"❌ 发送验证码失败: {str(e)}")
         log_debug(f"错误堆栈: {traceback.format_exc()}")
-        print(json.dumps({
+        return {
             'success': False,
             'error': str(e)
-        }))
+        }
 
 async def sign_in(phone, code, phone_code_hash, password, session_path, api_id, api_hash):
     """登录"""
-    import json as json_module
-    import sys
-    
-    # 添加详细日志到 stderr（不影响 JSON 输出）
-    def log_debug(msg):
-        print(f"[DEBUG] {msg}", file=sys.stderr, flush=True)
-    
+    load_telethon()
     try:
         log_debug(f"=== 开始登录流程 ===")
         log_debug(f"Session 路径: {session_path}")
         log_debug(f"API ID: {api_id}")
-        
-        # 检查登录前的文件状态
+
         session_file = f"{session_path}.session"
         session_journal = f"{session_path}.session-journal"
-        log_debug(f"预期 Session 文件: {session_file}")
-        log_debug(f"预期 Journal 文件: {session_journal}")
-        
-        # 检查目录是否存在
-        import os
         session_dir = os.path.dirname(session_path)
-        log_debug(f"Session 目录: {session_dir}")
-        log_debug(f"目录是否存在: {os.path.exists(session_dir)}")
-        if os.path.exists(session_dir):
-            log_debug(f"目录权限: {oct(os.stat(session_dir).st_mode)}")
-            log_debug(f"目录内容: {os.listdir(session_dir)}")
-        
-        # 检查登录前文件是否存在
-        log_debug(f"登录前 Session 文件存在: {os.path.exists(session_file)}")
-        log_debug(f"登录前 Journal 文件存在: {os.path.exists(session_journal)}")
-        
+
+        # 检查登录前的文件状态（仅调试模式，单次 scandir 替代 exists/stat/listdir 风暴）
+        if DEBUG_ENABLED:
+            log_debug(f"预期 Session 文件: {session_file}")
+            log_debug(f"预期 Journal 文件: {session_journal}")
+            log_debug(f"Session 目录: {session_dir}")
+            entries = scan_session_dir(session_dir)
+            log_debug(f"目录是否存在: {entries is not None}")
+            if entries is not None:
+                log_debug(f"目录权限: {oct(os.stat(session_dir).st_mode)}")
+                log_debug(f"目录内容: {sorted(entries)}")
+            log_debug(f"登录前 Session 文件存在: {os.path.basename(session_file) in (entries or {})}")
+            log_debug(f"登录前 Journal 文件存在: {os.path.basename(session_journal) in (entries or {})}")
+
         log_debug(f"创建 TelegramClient...")
         client = TelegramClient(session_path, api_id, api_hash)
         log_debug(f"连接 Telegram...")
         await client.connect()
+        tune_session_db(client)
         
         try:
             log_debug(f"发送验证码进行登录...")
@@ -153,195 +227,114 @@ async def sign_in(phone, code, phone_code_hash, password, session_path, api_id,
                 await client.sign_in(password=password)
             else:
                 await client.disconnect()
-                print(json.dumps({
+                return {
                     'success': False,
                     'password_required': True,
                     'message': '需要两步验证密码'
-                }))
-                return
+                }
         
         log_debug(f"登录成功，获取用户信息...")
         me = await client.get_me()
         log_debug(f"用户信息: {me.first_name} (ID: {me.id})")
-        
-        # 在断开连接前，检查 journal 文件是否存在（写入过程中会存在）
-        log_debug(f"=== 断开连接前检查 ===")
-        log_debug(f"断开前 Session 文件存在: {os.path.exists(session_file)}")
-        log_debug(f"断开前 Journal 文件存在: {os.path.exists(session_journal)}")
-        
+
+        # 验证直接复用当前已连接的 client：sign_in + get_me 成功本身就说明
+        # session 有效，无需再开一个 verify_client 做完整的 MTProto 握手。
+        # 如需额外验证可设置 TELETHON_VERIFY_SESSION=1。
+        verify_success = True
+        if os.getenv('TELETHON_VERIFY_SESSION') == '1':
+            try:
+                verify_me = await asyncio.wait_for(client.get_me(), timeout=5.0)
+                if str(verify_me.id) != str(me.id):
+                    verify_success = False
+                    log_debug(f"⚠️  警告：验证用户 ID 不匹配！")
+                else:
+                    log_debug(f"✅ Session 验证成功")
+            except Exception as verify_error:
+                log_debug(f"⚠️  验证 Session 时出错: {verify_error}")
+
         # 在断开连接前，确保 session 已保存
         log_debug(f"确保 session 已保存...")
-        await client.disconnect()
-        
-        # 立即检查 journal 文件（断开连接后，SQLite 可能会立即删除 journal 文件）
-        log_debug(f"=== 断开连接后立即检查 ===")
-        log_debug(f"断开后立即检查 - Session 文件存在: {os.path.exists(session_file)}")
-        log_debug(f"断开后立即检查 - Journal 文件存在: {os.path.exists(session_journal)}")
-        
-        # 如果 journal 文件存在，说明写入正在进行中，需要等待
-        if os.path.exists(session_journal):
-            log_debug(f"⚠️  Journal 文件存在，说明写入正在进行中，等待完成...")
-            # 轮询检查 journal 文件，直到它被删除（说明写入完成）
-            max_wait = 10  # 最多等待 10 秒
-            wait_count = 0
-            while os.path.exists(session_journal) and wait_count < max_wait:
-                await asyncio.sleep(0.5)
-                wait_count += 0.5
-                log_debug(f"等待 Journal 文件删除... ({wait_count} 秒)")
-            
-            if os.path.exists(session_journal):
-                log_debug(f"⚠️  警告：Journal 文件在等待 {max_wait} 秒后仍然存在，可能写入失败")
-            else:
-                log_debug(f"✅ Journal 文件已被删除，说明写入已完成")
-        else:
-            log_debug(f"✅ Journal 文件不存在，说明写入已完成或未使用 journal 模式")
-        
-        # 显式同步文件系统，确保文件写入磁盘
-        import sys
+        # 把 WAL 内容合并回主文件并截断 WAL，让 .session 文件自洽
+        # （监控端的大小/文件头探测只看主文件，不看 -wal）
         try:
-            sys.stdout.flush()
-            sys.stderr.flush()
-            # 使用 sync 命令强制同步文件系统
-            import subprocess
-            try:
-                subprocess.run(['sync'], check=False, timeout=5)
-                log_debug(f"已执行 sync 命令同步文件系统")
-            except Exception as sync_error:
-                log_debug(f"执行 sync 失败（不影响功能）: {sync_error}")
-        except Exception as e:
-            log_debug(f"同步文件系统时出错（不影响功能）: {e}")
-        
-        # 再等待一小段时间确保文件完全同步
-        await asyncio.sleep(1.0)
-        
-        # 验证 session 文件是否可以被正确读取（使用更严格的验证）
-        log_debug(f"=== 验证 Session 文件可读性 ===")
-        log_debug(f"验证使用的 Session 路径: {session_path}")
-        log_debug(f"验证使用的 API_ID: {api_id}")
-        log_debug(f"验证使用的 API_HASH: {'已设置' if api_hash else '未设置'}")
-        
-        # 检查 session 文件是否存在
-        session_file_verify = f"{session_path}.session"
-        log_debug(f"验证 Session 文件路径: {session_file_verify}")
-        log_debug(f"Session 文件存在: {os.path.exists(session_file_verify)}")
-        if os.path.exists(session_file_verify):
-            file_stat = os.stat(session_file_verify)
-            log_debug(f"Session 文件大小: {file_stat.st_size} 字节")
+            conn = getattr(client.session, '_conn', None)
+            if conn is not None:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception:
+            pass
+        await client.disconnect()
         
-        verify_success = False
+        # WAL 模式下不存在 -journal 文件，无需轮询等待 SQLite 删除 journal
+
+        # 只对 session 文件本身做一次 fsync，确保落盘
+        # （SQLite 自身的 commit 已经 fsync 过数据，这里只是额外保险；
+        #   不再使用 sync 命令做全系统回写，也不再额外 sleep。
+        #   fsync 在慢盘上可能阻塞，放到线程里执行避免卡住事件循环）
         try:
-            verify_client = TelegramClient(session_path, api_id, api_hash)
-            # 设置连接超时，避免验证过程过长
-            await asyncio.wait_for(verify_client.connect(), timeout=10.0)
-            
-            # 先检查授权状态
-            is_authorized = await verify_client.is_user_authorized()
-            log_debug(f"验证结果 - 授权状态: {is_authorized}")
-            
-            if is_authorized:
-                # 如果授权状态为 True，尝试获取用户信息确认
-                try:
-                    verify_me = await asyncio.wait_for(verify_client.get_me(), timeout=5.0)
-                    log_debug(f"验证结果 - 用户: {verify_me.first_name} (ID: {verify_me.id})")
-                    if str(verify_me.id) != str(me.id):
-                        log_debug(f"⚠️  警告：验证用户 ID 不匹配！")
-                    else:
-                        verify_success = True
-                        log_debug(f"✅ Session 文件验证成功")
-                except asyncio.TimeoutError:
-                    log_debug(f"⚠️  获取用户信息超时（可能是 OOM 导致），但 session 文件存在，假设登录成功")
-                    verify_success = True  # 如果 session 文件存在且授权状态为 True，假设登录成功
-                except Exception as get_me_error:
-                    log_debug(f"⚠️  获取用户信息失败: {get_me_error}")
-            else:
-                # 如果授权状态为 False，尝试启动客户端验证（因为 is_user_authorized() 可能不准确）
-                log_debug(f"⚠️  授权状态为 False，尝试启动客户端验证...")
-                try:
-                    await asyncio.wait_for(verify_client.start(), timeout=10.0)
-                    verify_me = await asyncio.wait_for(verify_client.get_me(), timeout=5.0)
-                    log_debug(f"✅ 客户端启动成功，Session 文件有效（is_user_authorized() 可能不准确）")
-                    log_debug(f"验证结果 - 用户: {verify_me.first_name} (ID: {verify_me.id})")
-                    if str(verify_me.id) == str(me.id):
-                        verify_success = True
-                        log_debug(f"✅ Session 文件验证成功")
-                    else:
-                        log_debug(f"⚠️  警告：验证用户 ID 不匹配！")
-                except Exception as rpc_err:
-                    # 检查是否是 RPC 错误（AUTH_KEY_UNREGISTERED，错误代码 401）
-                    # Telethon 的 RPC 错误通常有 code 和 message 属性
-                    if hasattr(rpc_err, 'code') and rpc_err.code == 401:
-                        log_debug(f"❌ AUTH_KEY_UNREGISTERED: Session 文件中的认证密钥无效: {rpc_err}")
-                    elif hasattr(rpc_err, 'code'):
-                        log_debug(f"⚠️  RPC 错误 (code: {rpc_err.code}): {rpc_err}")
-                    else:
-                        log_debug(f"⚠️  错误: {rpc_err}")
-                except EOFError as eof_err:
-                    log_debug(f"❌ EOFError: Session 文件无效，无法启动客户端: {eof_err}")
-                except asyncio.TimeoutError:
-                    log_debug(f"⚠️  启动客户端超时（可能是 OOM 导致），但 session 文件存在，假设登录成功")
-                    verify_success = True  # 如果 session 文件存在，假设登录成功（可能是 OOM 导致超时）
-                except Exception as start_error:
-                    log_debug(f"⚠️  启动客户端失败: {start_error}")
-            
-            await verify_client.disconnect()
-        except asyncio.TimeoutError:
-            log_debug(f"⚠️  验证 Session 文件超时（可能是 OOM 导致），但 session 文件存在，假设登录成功")
-            verify_success = True  # 如果 session 文件存在，假设登录成功（可能是 OOM 导致超时）
-        except Exception as verify_error:
-            log_debug(f"⚠️  验证 Session 文件时出错: {verify_error}")
-            import traceback
-            log_debug(f"验证错误堆栈: {traceback.format_exc()}")
-        
+            await asyncio.to_thread(fsync_file, session_file)
+            log_debug(f"已对 Session 文件执行 fsync")
+        except FileNotFoundError:
+            pass
+        except Exception as sync_error:
+            log_debug(f"fsync 失败（不影响功能）: {sync_error}")
+
         if not verify_success:
             log_debug(f"⚠️  警告：Session 文件验证失败，但继续返回成功（可能需要在 Telethon 服务中重试）")
-        
+
         # 检查登录后的文件状态
-        log_debug(f"=== 登录后文件检查 ===")
-        log_debug(f"登录后 Session 文件存在: {os.path.exists(session_file)}")
-        log_debug(f"登录后 Journal 文件存在: {os.path.exists(session_journal)}")
-        
-        if os.path.exists(session_file):
-            file_stat = os.stat(session_file)
-            log_debug(f"Session 文件大小: {file_stat.st_size} 字节")
-            log_debug(f"Session 文件权限: {oct(file_stat.st_mode)}")
-            log_debug(f"Session 文件修改时间: {file_stat.st_mtime}")
-            
-            # 尝试读取文件内容验证文件完整性
-            try:
-                with open(session_file, 'rb') as f:
-                    file_content = f.read()
-                    log_debug(f"Session 文件可读，内容长度: {len(file_content)} 字节")
-                    if len(file_content) == 0:
+        if DEBUG_ENABLED:
+            log_debug(f"=== 登录后文件检查 ===")
+            # 单次 scandir 回答后续所有存在性/大小问题
+            entries = scan_session_dir(session_dir)
+            session_name = os.path.basename(session_file)
+            journal_name = os.path.basename(session_journal)
+            file_stat = (entries or {}).get(session_name)
+            journal_stat = (entries or {}).get(journal_name)
+            log_debug(f"登录后 Session 文件存在: {file_stat is not None}")
+            log_debug(f"登录后 Journal 文件存在: {journal_stat is not None}")
+
+            if file_stat is not None:
+                log_debug(f"Session 文件大小: {file_stat.st_size} 字节")
+                log_debug(f"Session 文件权限: {oct(file_stat.st_mode)}")
+                log_debug(f"Session 文件修改时间: {file_stat.st_mtime}")
+
+                # 读文件头验证可读性即可，大小已由 stat 提供，无需整读文件
+                try:
+                    with open(session_file, 'rb') as f:
+                        header = f.read(16)
+                    log_debug(f"Session 文件可读，大小: {file_stat.st_size} 字节")
+                    if file_stat.st_size == 0:
                         log_debug(f"⚠️  Session 文件为空！")
-            except Exception as read_error:
-                log_debug(f"⚠️  无法读取 Session 文件: {read_error}")
-        else:
-            log_debug(f"⚠️  Session 文件不存在！")
-            # 列出目录内容
-            if os.path.exists(session_dir):
-                log_debug(f"目录内容: {os.listdir(session_dir)}")
-        
-        if os.path.exists(session_journal):
-            log_debug(f"Journal 文件大小: {os.stat(session_journal).st_size} 字节")
-        
-        # 检查 volume 挂载点
-        log_debug(f"检查 /tmp/session_volume 目录...")
-        if os.path.exists('/tmp/session_volume'):
-            log_debug(f"/tmp/session_volume 存在")
-            volume_files = os.listdir('/tmp/session_volume')
-            log_debug(f"/tmp/session_volume 内容: {volume_files}")
-            log_debug(f"/tmp/session_volume 文件数量: {len(volume_files)}")
-            
-            # 检查目标文件是否在 volume 中
-            target_file = os.path.basename(session_file)
-            if target_file in volume_files:
-                log_debug(f"✅ 目标文件 {target_file} 在 volume 中")
+                    elif not header.startswith(b'SQLite format 3'):
+                        log_debug(f"⚠️  Session 文件头异常: {header.hex()}")
+                except Exception as read_error:
+                    log_debug(f"⚠️  无法读取 Session 文件: {read_error}")
             else:
-                log_debug(f"⚠️  目标文件 {target_file} 不在 volume 中")
-        else:
-            log_debug(f"⚠️  /tmp/session_volume 不存在！")
-        
-        print(json.dumps({
+                log_debug(f"⚠️  Session 文件不存在！")
+                # 列出目录内容
+                if entries is not None:
+                    log_debug(f"目录内容: {sorted(entries)}")
+
+            if journal_stat is not None:
+                log_debug(f"Journal 文件大小: {journal_stat.st_size} 字节")
+
+            # 检查 volume 挂载点
+            log_debug(f"检查 /tmp/session_volume 目录...")
+            volume_entries = scan_session_dir('/tmp/session_volume')
+            if volume_entries is not None:
+                log_debug(f"/tmp/session_volume 存在")
+                log_debug(f"/tmp/session_volume 内容: {sorted(volume_entries)}")
+                log_debug(f"/tmp/session_volume 文件数量: {len(volume_entries)}")
+
+                # 检查目标文件是否在 volume 中
+                if session_name in volume_entries:
+                    log_debug(f"✅ 目标文件 {session_name} 在 volume 中")
+                else:
+                    log_debug(f"⚠️  目标文件 {session_name} 不在 volume 中")
+            else:
+                log_debug(f"⚠️  /tmp/session_volume 不存在！")
+
+        return {
             'success': True,
             'message': f'登录成功！已登录为: {me.first_name}',
             'user': {
@@ -350,45 +343,98 @@ async def sign_in(phone, code, phone_code_hash, password, session_path, api_id,
                 'last_name': getattr(me, 'last_name', None),
                 'username': me.username
             }
-        }))
+        }
     except Exception as e:
         import traceback
         log_debug(f"❌ 登录失败: {str(e)}")
         log_debug(f"错误堆栈: {traceback.format_exc()}")
-        print(json.dumps({
+        return {
             'success': False,
             'error': str(e)
-        }))
+        }
+
+async def dispatch_request(req):
+    """根据 JSON 请求分发到对应的登录命令"""
+    cmd = req.get('cmd')
+    if cmd == 'check':
+        return await check_login_status(req['session_path'], int(req['api_id']), req['api_hash'])
+    elif cmd == 'send_code':
+        return await send_code(req['phone'], req['session_path'], int(req['api_id']), req['api_hash'],
+                               skip_auth_check=bool(req.get('skip_auth_check')))
+    elif cmd == 'sign_in':
+        return await sign_in(
+            req.get('phone'), req.get('code'), req.get('phone_code_hash'),
+            req.get('password') or None,
+            req['session_path'], int(req['api_id']), req['api_hash']
+        )
+    else:
+        return {'success': False, 'error': f'未知命令: {cmd}'}
+
+async def serve_stdin():
+    """常驻 worker 模式：从 stdin 逐行读取 JSON 命令并执行
+
+    一次性 CLI 每次调用都要付出解释器启动 + import telethon + 事件循环
+    创建的开销（数百毫秒）。serve 模式下这些成本只付一次，后续命令在
+    同一事件循环中执行，每行输入对应一行 JSON 输出（携带请求中的 id）。
+    请求格式: {"id": 1, "cmd": "send_code", "phone": ..., "session_path": ..., "api_id": ..., "api_hash": ...}
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break  # stdin 关闭，父进程退出
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError as e:
+            emit({'success': False, 'error': f'无效的 JSON 请求: {e}'})
+            continue
+        try:
+            result = await dispatch_request(req)
+        except KeyError as e:
+            result = {'success': False, 'error': f'缺少参数: {e}'}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        if req.get('id') is not None:
+            result = dict(result, id=req.get('id'))
+        emit(result)
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        print(json.dumps({'success': False, 'error': '缺少命令参数'}))
+        emit({'success': False, 'error': '缺少命令参数'})
         sys.exit(1)
-    
+
     command = sys.argv[1]
-    
-    if command == 'check':
+
+    if command == 'serve':
+        asyncio.run(serve_stdin())
+
+    elif command == 'check':
         if len(sys.argv) < 5:
-            print(json.dumps({'success': False, 'error': '参数不足'}))
+            emit({'success': False, 'error': '参数不足'})
             sys.exit(1)
         session_path = sys.argv[2]
         api_id = int(sys.argv[3])
         api_hash = sys.argv[4]
-        asyncio.run(check_login_status(session_path, api_id, api_hash))
-    
+        emit(asyncio.run(check_login_status(session_path, api_id, api_hash)))
+
     elif command == 'send_code':
         if len(sys.argv) < 6:
-            print(json.dumps({'success': False, 'error': '参数不足'}))
+            emit({'success': False, 'error': '参数不足'})
             sys.exit(1)
         phone = sys.argv[2]
         session_path = sys.argv[3]
         api_id = int(sys.argv[4])
         api_hash = sys.argv[5]
-        asyncio.run(send_code(phone, session_path, api_id, api_hash))
-    
+        # 可选第 6 个参数：调用方已确认未登录时传 1 跳过授权预检查
+        skip_auth_check = len(sys.argv) > 6 and sys.argv[6] == '1'
+        emit(asyncio.run(send_code(phone, session_path, api_id, api_hash, skip_auth_check=skip_auth_check)))
+
     elif command == 'sign_in':
         if len(sys.argv) < 8:
-            print(json.dumps({'success': False, 'error': '参数不足'}))
+            emit({'success': False, 'error': '参数不足'})
             sys.exit(1)
         phone = sys.argv[2]
         code = sys.argv[3]
@@ -397,8 +443,8 @@ if __name__ == '__main__':
         session_path = sys.argv[6]
         api_id = int(sys.argv[7])
         api_hash = sys.argv[8]
-        asyncio.run(sign_in(phone, code, phone_code_hash, password, session_path, api_id, api_hash))
-    
+        emit(asyncio.run(sign_in(phone, code, phone_code_hash, password, session_path, api_id, api_hash)))
+
     else:
-        print(json.dumps({'success': False, 'error': f'未知命令: {command}'}))
+        emit({'success': False, 'error': f'未知命令: {command}'})
 
@@ -1,28 +1,190 @@
-from pymongo import MongoClient
+import atexit
+import os
+import threading
+
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# 与 monitor.py 保持一致：连接参数从环境变量读取，硬编码只作默认值。
+# 生产可在 MONGO_URL 里带上认证/副本集/压缩参数（如 ?compressors=zstd）
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://mongo:27017")
+MONGO_DBNAME = os.getenv("MONGO_DBNAME", "tglogs")
+
+# 模块级共享客户端：每次 MongoClient(...) 都会新起 SDAM 拓扑监控线程
+# 并重新建 TCP 连接，多个入口重复调用 ensure_indexes 时复用连接池即可
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    """懒初始化并复用模块级 MongoClient"""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000)
+                atexit.register(_CLIENT.close)
+    return _CLIENT
+
+
+def fast_count(coll, flt=None):
+    """分页/统计用的快速计数
+
+    - 空条件走 estimated_document_count()（直接读集合元数据，不扫描）；
+    - 非空条件交给规划器选索引：alerted/ai_analyzed 等条件正好命中
+      本模块建的 partial 索引，强制 hint("_id_") 反而会退化成全表扫描。
+    """
+    if not flt:
+        return coll.estimated_document_count()
+    return coll.count_documents(flt)
+
+
+def _create_or_replace(logs, model):
+    """创建单个索引；同名/同键但选项不同（IndexOptionsConflict, code 85）时
+    删除真正冲突的旧索引再重建，让索引选项可以随版本演进而无需手工迁移
+
+    冲突的可能是"同名不同选项"也可能是"同键不同名"，所以不能直接按
+    新模型的名字删（同键不同名时该名字根本不存在，drop 会报 index not
+    found）；改为从 listIndexes 里找出同名或同键的现有索引，按它们
+    实际的名字删除。"""
+    try:
+        logs.create_indexes([model])
+    except OperationFailure as e:
+        if e.code != 85:
+            raise
+        doc = model.document
+        new_key = tuple(doc["key"].items())
+        for idx in logs.list_indexes():
+            if idx["name"] == "_id_":
+                continue
+            if idx["name"] == doc["name"] or tuple(idx["key"].items()) == new_key:
+                logs.drop_index(idx["name"])
+        logs.create_indexes([model])
+
+
+def _create_indexes_concurrently(logs, models):
+    """批量 createIndexes 不可用时的回退：线程池并发发起单条 create_index
+
+    每个调用都是纯网络 IO（PyMongo 在 socket 读写时释放 GIL），并发后
+    墙钟时间从 N×RTT 降到约 1×RTT。每个 worker 从客户端连接池各取一条连接。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _create_one(model):
+        doc = dict(model.document)
+        keys = list(doc.pop("key").items())
+        doc.pop("v", None)
+        return logs.create_index(keys, **doc)
+
+    with ThreadPoolExecutor(max_workers=len(models)) as ex:
+        list(ex.map(_create_one, models))
+
 
 def ensure_indexes():
     # 静默连接，不输出日志
-    client = MongoClient("mongodb://mongo:27017/tglogs", serverSelectionTimeoutMS=5000)
-    db = client.tglogs
+    client = get_client()
+    db = client[MONGO_DBNAME]
     logs = db.logs
 
     # 静默创建索引，不输出日志
+    # 所有索引打包成一个 createIndexes 命令，8 次网络往返合并为 1 次
+    # background=True：老版本 MongoDB 上避免前台建索引对集合加排他锁、
+    # 阻塞 Telethon 写入（4.2+ 的混合构建本来就不阻塞，该选项被忽略）；
+    # 显式 name= 让后续 listIndexes 对比和按名删除有确定的名字可用
+    models = [
+        # 基础索引
+        # 注意：channelId / ai_analyzed 的单字段索引被下面复合索引的
+        # 最左前缀完全覆盖，不再单独创建（省索引内存 + 每次插入少更新一棵 B-tree）
+        IndexModel([("time", DESCENDING)], name="time_-1", background=True),
+        IndexModel([("messageId", ASCENDING)], name="messageId_1", background=True),
+
+        # 关键词检索用 text 索引（倒排结构），$text 查询不再逐文档展开数组；
+        # default_language="none" 关闭词干化/停用词，中文关键词按原样索引。
+        # 等值查询用的 keywords_1 B-tree 仍由后端 logModel.js 的 schema 索引维护
+        IndexModel([("keywords", "text")], name="keywords_text", background=True,
+                   default_language="none"),
+
+        # 重要：alerted 只索引被查询的少数值（partial index）。
+        # countDocuments({ alerted: true }) 只命中布尔值偏斜的一侧，
+        # partial B-tree 条目数从 O(N) 降到 O(少数侧)
+        IndexModel([("alerted", ASCENDING)], name="alerted_true", background=True,
+                   partialFilterExpression={"alerted": True}),
+
+        # 复合索引优化常见查询
+        # ESR 顺序：等值条件 ai_analyzed 在前、排序键 time 在后，
+        # find({ai_analyzed:false}).sort({time:-1}) 可直接按索引序扫描，
+        # 不用内存排序；配合 partial filter 只索引未分析的行
+        IndexModel([("ai_analyzed", ASCENDING), ("time", DESCENDING)],
+                   name="ai_analyzed_1_time_-1", background=True,
+                   partialFilterExpression={"ai_analyzed": False}),  # 用于查找未分析的消息按时间排序
+        IndexModel([("channelId", ASCENDING), ("time", DESCENDING)],
+                   name="channelId_1_time_-1", background=True),   # 用于按频道查询
+
+        # 核心分诊查询“频道 X 的未分析消息按时间倒序”的覆盖索引（ESR 顺序），
+        # 避免规划器只能选一个复合索引、剩余条件在内存里过滤；
+        # partial filter 让索引只含未分析行，保持很小
+        IndexModel([("channelId", ASCENDING), ("ai_analyzed", ASCENDING), ("time", DESCENDING)],
+                   name="ch_ai_time", background=True,
+                   partialFilterExpression={"ai_analyzed": False}),
+    ]
+    # 先用一次 listIndexes 对比现有索引，已存在的 key spec 不再重复提交；
+    # 容器热重启时 8 个 createIndexes 往返直接归零，只剩一次 listIndexes。
+    # 对比包含 partialFilterExpression，避免把旧的全量索引当作 partial 索引
+    def _spec(key_doc, partial):
+        return (tuple(key_doc.items()), tuple(sorted((partial or {}).items())))
+
+    existing_indexes = list(logs.list_indexes())
+    existing = {_spec(idx["key"], idx.get("partialFilterExpression")) for idx in existing_indexes}
+    existing_names = {idx["name"] for idx in existing_indexes}
+
+    # 被 partial / 复合索引取代的旧索引，按名删除释放索引内存和写放大
+    for obsolete in ("ai_analyzed_1", "alerted_1", "time_-1_ai_analyzed_1",
+                     "channelId_1", "ai_analyzed_false"):
+        if obsolete in existing_names:
+            logs.drop_index(obsolete)
+
+    def _is_text(model):
+        return any(v == "text" for v in model.document["key"].values())
+
+    # spec 一致的直接跳过；同名但 spec 已不同的索引说明选项随版本演进了，
+    # 走替换路径删旧建新——按名跳过只保留给 text 索引（它在 listIndexes
+    # 里的 key 是内部的 _fts/_ftsx 形式，和 IndexModel 的 key 对不上，
+    # 没法做 spec 对比，只能按名字去重）
+    to_create = []
+    to_replace = []
+    for m in models:
+        if _spec(m.document["key"], m.document.get("partialFilterExpression")) in existing:
+            continue
+        if m.document["name"] in existing_names:
+            if _is_text(m):
+                continue
+            to_replace.append(m)
+        else:
+            to_create.append(m)
+
+    for model in to_replace:
+        _create_or_replace(logs, model)
+
+    if to_create:
+        if hasattr(logs, "create_indexes"):
+            try:
+                logs.create_indexes(to_create)
+            except OperationFailure as e:
+                if e.code != 85:
+                    raise
+                # 选项冲突会中止整个批次，退化成逐个“冲突即重建”，
+                # 保证批次里其余索引仍然全部创建
+                for model in to_create:
+                    _create_or_replace(logs, model)
+        else:
+            _create_indexes_concurrently(logs, to_create)
 
-    # 基础索引
-    logs.create_index([("time", -1)])
-    logs.create_index([("channelId", 1)])
-    logs.create_index([("messageId", 1)])
-    logs.create_index([("keywords", 1)])
-    
-    # 重要：添加 ai_analyzed 索引，避免 countDocuments({ ai_analyzed: false }) 查询慢
-    logs.create_index([("ai_analyzed", 1)])
-    
-    # 重要：添加 alerted 索引，避免 countDocuments({ alerted: true }) 查询慢
-    logs.create_index([("alerted", 1)])
-    
-    # 复合索引优化常见查询
-    logs.create_index([("time", -1), ("ai_analyzed", 1)])  # 用于查找未分析的消息按时间排序
-    logs.create_index([("channelId", 1), ("time", -1)])   # 用于按频道查询
+    # 启动时校验关键索引确实存在：缺失会让 countDocuments/按频道查询
+    # 退化成全表扫描，宁可启动即失败也不要静默变慢
+    required = {"ai_analyzed_1_time_-1", "channelId_1_time_-1"}
+    missing = required - set(logs.index_information())
+    if missing:
+        raise RuntimeError(f"关键索引缺失: {sorted(missing)}")
 
     # 静默完成，不输出日志
 
@@ -1,16 +1,66 @@
 
 # monitor_async.py
 import os
+import sys
+import time
 import json
 import re
 import asyncio
+import copy
+import functools
+import random
+from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 import psutil
 import logging
 import signal
+import stat as stat_module
 import traceback
 
+# uvloop（libuv 的 Cython 封装）对 socket 密集型负载有 2~4 倍吞吐提升，
+# 装了就用，没装则回退到默认 asyncio 循环
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# pyahocorasick（C 扩展多模式匹配）：关键词多时一次线性扫描代替逐词 in 检查
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Intel Hyperscan：把全部关键词编译进单个 SIMD 加速的 DFA，几百个关键词
+# 也只需一次扫描；未安装时回退 pyahocorasick / 逐词 in
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# orjson 序列化/反序列化比 stdlib json 快数倍，未安装时回退 stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# google-re2：线性时间正则引擎。alert_regex 是用户在配置里随意写的，
+# 嵌套量词在 stdlib re 下可能灾难性回溯卡死整个监控；re2 没有这个问题。
+# re2 不支持的语法（如环视）逐条回退 stdlib re
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+if orjson is not None:
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    _json_loads = orjson.loads
+else:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
 from telethon import TelegramClient, events
 from telethon.sessions import StringSession
 from telethon.tl.types import PeerUser, PeerChat, PeerChannel
@@ -23,7 +73,8 @@ from mongo_index_init import ensure_indexes
 # -----------------------
 # 日志（必须在任何 logger.* 调用前初始化）
 # -----------------------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("tg_monitor")
 
 # -----------------------
@@ -80,6 +131,13 @@ SESSION_PREFIX = os.getenv("SESSION_PREFIX", "user")
 SESSION_STRING = os.getenv("SESSION_STRING", "").strip()
 # 用户ID - 用于数据隔离，从环境变量读取
 USER_ID = os.getenv("USER_ID", "").strip()
+# 每条消息写库都要带 userId：启动时解析一次 ObjectId，热路径不再重复构造
+from bson import ObjectId
+try:
+    _USER_OBJECTID = ObjectId(USER_ID) if USER_ID else None
+except Exception:
+    _USER_OBJECTID = None
+_USER_OBJECTID_STR = str(_USER_OBJECTID) if _USER_OBJECTID else None
 
 # 并发限制（可调）
 AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "2"))
@@ -104,21 +162,36 @@ mongo_client = motor.motor_asyncio.AsyncIOMotorClient(
 )
 db = mongo_client[MONGO_DBNAME]
 logs_collection = db["logs"]
+# 监控日志允许崩溃时丢极少量数据：w=0（不等服务器确认）省掉批量写的
+# 一次网络往返；_id 在客户端预生成，调用方拿 log_id 不依赖确认
+from pymongo import WriteConcern
+fast_logs_collection = logs_collection.with_options(write_concern=WriteConcern(w=0))
 
 # aiohttp session will be created on loop start
 http_session: Optional[aiohttp.ClientSession] = None
 
 # config cache and compiled regex
 CONFIG_CACHE: Dict[str, Any] = {}
-CONFIG_MTIME = 0.0
+CONFIG_SENTINEL = (0, 0)  # (st_mtime_ns, st_size)：双哨兵，mtime 粒度不够时 size 兜底
 COMPILED_ALERT_REGEX: List[re.Pattern] = []
+COMPILED_ALERT_REGEX_UNION: Optional[re.Pattern] = None  # 合并后的大正则，一次扫描做快速排除
+COMPILED_ALERT_REGEX_LITERALS: List[Optional[str]] = []  # 每条模式的必现字面量（提不出来为 None）
 KEYWORDS_LC: List[str] = []
 ALERT_KEYWORDS_LC: List[str] = []
+KEYWORD_AC = None  # Aho-Corasick 自动机：监控/告警关键词合并，一次扫描找出全部命中
+KEYWORD_HS = None  # Hyperscan 数据库及 id->关键词映射：(db, [(monitor_kw, alert_kw), ...])
 MONITORED_CHANNELS_SET: set = set()
+AI_TRIGGER_USERS_LC: frozenset = frozenset()  # AI 触发用户（已规范化+lower），供交集判断
+AI_TRIGGER_ENABLED = False  # AI 触发开关，配置加载时取一次，热路径不再查嵌套 dict
+
+# AI 分析改为有界队列 + 固定 worker 池（原 semaphore 只限并发，突发时
+# 每个触发仍会堆一个 pending task 等锁）；队列满时丢新任务并计数
+_ai_queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+_ai_dropped = 0
 
-# async semaphores to limit concurrency for heavy tasks
-ai_semaphore = asyncio.Semaphore(AI_CONCURRENCY)
-alert_semaphore = asyncio.Semaphore(ALERT_CONCURRENCY)
+# 告警改为有界队列 + 固定 worker 池：semaphore 只限并发，突发时仍会
+# 每条告警堆一个 pending task；队列满则丢最旧的，保证内存有上界
+_alert_queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
 
 # message-notify batching buffer (reduces HTTP QPS & CPU)
 _notify_lock = asyncio.Lock()
@@ -129,22 +202,188 @@ _notify_flushing = False
 # shutdown event
 SHUTDOWN = asyncio.Event()
 
+# 日志写库批量化：insert_one 每条消息一次 Mongo 往返，高峰期是主要延迟来源。
+# 改为有界队列 + 后台批量写（攒满 LOG_BATCH_MAX 条或到时间窗就 insert_many）
+LOG_BATCH_MAX = int(os.getenv("LOG_BATCH_MAX", "100"))
+LOG_BATCH_WINDOW_MS = int(os.getenv("LOG_BATCH_WINDOW_MS", "200"))
+_log_queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+
 # sender 显示名缓存（减少高频消息下重复 get_entity / GetFullUserRequest 的 CPU/网络开销）
 SENDER_CACHE_TTL_SEC = float(os.getenv("SENDER_CACHE_TTL_SEC", "3600"))  # 1小时
 _SENDER_DISPLAY_CACHE: Dict[str, Any] = {}  # sender_id(str) -> {"sender": str, "ts": float}
 TOPIC_CACHE_TTL_SEC = float(os.getenv("TOPIC_CACHE_TTL_SEC", "3600"))
 _TOPIC_TITLE_CACHE: Dict[str, Any] = {}  # "channel_id:topic_id" -> {"title": str, "ts": float}
 
+# 对话信息缓存：event.get_chat() 未命中 session 缓存时要走 RPC，而频道的
+# 名称/用户名几乎不变，按 chat_id 缓存解析结果，热路径不再每条消息取实体
+CHAT_CACHE_TTL_SEC = float(os.getenv("CHAT_CACHE_TTL_SEC", "300"))
+_CHAT_INFO_CACHE: Dict[str, Any] = {}  # chat_id(str) -> {"channel_id", "channel_name", ..., "ts"}
+ENTITY_CACHE_MAX = int(os.getenv("ENTITY_CACHE_MAX", "2048"))
+
+# 实体解析 RPC 去重（single-flight）：同一陌生用户突发多条消息时，
+# 并发的 get_entity / GetFullUserRequest 共享一次网络往返；
+# 失败结果进短 TTL 负缓存，避免每条消息重试注定失败的查询
+_PENDING_RPC: Dict[Any, asyncio.Future] = {}
+_RPC_NEG_CACHE: Dict[Any, float] = {}  # key -> 失败时刻
+RPC_NEG_TTL_SEC = float(os.getenv("RPC_NEG_TTL_SEC", "60"))
+
+
+def _cache_put(cache: Dict[str, Any], key: str, value, max_entries: int = None):
+    """有界缓存写入：dict 保持插入序，超过上限时淘汰最旧的条目"""
+    cache.pop(key, None)
+    cache[key] = value
+    limit = max_entries or ENTITY_CACHE_MAX
+    while len(cache) > limit:
+        cache.pop(next(iter(cache)))
+
+
+async def _single_flight(key, make_coro):
+    """按 key 去重并发 RPC：先到的调用发起请求，后到的等同一个 Future
+
+    异常不向外抛——返回 None 并把 key 记入负缓存（RPC_NEG_TTL_SEC 内
+    直接短路返回 None），调用方按"没查到"处理即可。
+    """
+    ts = _RPC_NEG_CACHE.get(key)
+    if ts is not None:
+        if time.time() - ts < RPC_NEG_TTL_SEC:
+            return None
+        _RPC_NEG_CACHE.pop(key, None)
+
+    fut = _PENDING_RPC.get(key)
+    if fut is not None:
+        return await fut
+
+    fut = asyncio.get_running_loop().create_future()
+    _PENDING_RPC[key] = fut
+    result = None
+    try:
+        result = await make_coro()
+    except Exception as e:
+        logger.debug("实体解析失败，进入负缓存 %ss: key=%s err=%s", RPC_NEG_TTL_SEC, key, e)
+        _cache_put(_RPC_NEG_CACHE, key, time.time())
+    finally:
+        _PENDING_RPC.pop(key, None)
+        if not fut.done():
+            fut.set_result(result)
+    return result
+
 
 # CPU监控 - 使用缓存减少开销，避免频繁调用导致CPU峰值
 _cpu_process = None
 _cpu_last_check = 0
 _cpu_check_interval = 10.0  # 每10秒最多检查一次
+_cpu_last_times = None      # 上次采样的 cpu_times()，用于差分计算占用率
+_cpu_last_mono = 0.0        # 上次采样的单调时钟
 
 
 # -----------------------
 # 工具函数
 # -----------------------
+def _stat_or_none(path):
+    """单次 os.stat 同时回答存在性/大小/权限/修改时间，替代 exists/getmtime/stat 连环调用"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _peek_header(path, n=16):
+    """用一次 open/pread/close 读取文件头，供可读性和 SQLite 格式检查复用"""
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return os.pread(fd, n, 0)
+    finally:
+        os.close(fd)
+
+
+@dataclass
+class SessionInfo:
+    """session 文件的一次性探测结果，main() 各检查点直接复用，不再各自 stat/读文件"""
+    exists: bool = False
+    size: int = 0
+    mode: int = 0
+    mtime: float = 0.0
+    header: bytes = b""
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.header.startswith(b"SQLite format 3")
+
+
+def _tune_session_db(client):
+    """为 SQLite session 启用 WAL 模式，与 login_helper.py 的写入端保持一致
+
+    WAL + synchronous=NORMAL 让 Telethon 的 session 提交不再走 DELETE
+    journal 的创建/同步/删除往返，读写方也能各自持有连接不互相阻塞；
+    busy_timeout 让 SQLite 在文件短暂被锁时自己等待，减少上层
+    "database is locked" 重试循环真正触发的次数。
+    """
+    try:
+        conn = getattr(client.session, '_conn', None)
+        if conn is None:
+            return
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+    except Exception:
+        # 非 SQLite session 或 PRAGMA 失败时不影响启动流程
+        pass
+
+
+# 只有瞬时性错误（网络/超时类）值得重试；认证、配置类错误重试只会白白烧时间
+_TRANSIENT_ERRORS = (ConnectionError, asyncio.TimeoutError, OSError)
+
+
+def _backoff_delay(attempt):
+    """指数退避 + 小抖动，封顶 4 秒，避免多个实例同时重试打出同步尖峰"""
+    return min(0.25 * (1 << attempt), 4.0) + random.uniform(0, 0.1)
+
+
+def _probe_session(path) -> SessionInfo:
+    """单次 stat + 单次 pread 完成 session 文件的全部探测"""
+    st = _stat_or_none(path)
+    if st is None:
+        return SessionInfo()
+    # 权限不对时 os.access 提前给出明确提示，不用等 open 抛 EACCES
+    if not os.access(path, os.R_OK):
+        logger.warning("⚠️  [Session 检查] 当前用户对 Session 文件无读取权限: %s", path)
+        return SessionInfo(True, st.st_size, st.st_mode, st.st_mtime, b"")
+    try:
+        header = _peek_header(path)
+    except OSError:
+        header = b""
+    return SessionInfo(True, st.st_size, st.st_mode, st.st_mtime, header)
+
+
+# “请先登录”引导横幅：多个失败路径共用同一段文案，集中成常量统一维护；
+# 预先拼成单个多行字符串，发横幅时只产生一条 LogRecord 而不是 18 条
+_LOGIN_HELP = "\n".join((
+    "",
+    "📱 请先登录 Telegram 才能开始监控消息：",
+    "   1. 访问 Web 界面",
+    "   2. 进入 '设置' 标签",
+    "   3. 点击 'Telegram 首次登录' 按钮",
+    "   4. 按照提示完成登录（输入手机号和验证码）",
+    "   5. 登录成功后，重启 Telethon 服务：",
+    "      docker compose restart telethon",
+    "",
+    "⚠️  服务将退出，请完成登录后重启服务",
+    "=" * 60,
+    "",
+))
+
+
+def _exit_for_login(*reason_lines):
+    """用单条 logger.error 打印登录引导横幅后退出
+
+    使用 sys.exit(1) 非正常退出，触发 on-failure 重启策略
+    """
+    logger.error("%s", "\n".join(("", "=" * 60) + reason_lines + (_LOGIN_HELP,)))
+    sys.exit(1)
+
+
 def normalize_list(values) -> List[str]:
     """将任意输入转换为去除空白的字符串列表."""
     if values is None:
@@ -187,53 +426,111 @@ def extract_topic_id_from_message(message) -> Optional[str]:
     return str(topic_id_int) if topic_id_int > 0 else None
 
 
-async def resolve_topic_title(client, chat, topic_id: Optional[str]) -> str:
-    """Resolve a forum topic title with a short TTL cache."""
-    if not client or not chat or not topic_id:
+async def resolve_topic_title(client, peer, channel_id: str, topic_id: Optional[str]) -> str:
+    """Resolve a forum topic title with a short TTL cache.
+
+    peer 可以是完整实体，也可以是 input peer（对话信息走缓存时没有完整实体）。
+    """
+    if not client or peer is None or not topic_id:
         return ""
 
-    import time as _time
-    channel_id = str(getattr(chat, "id", ""))
     cache_key = f"{channel_id}:{topic_id}"
     cached = _TOPIC_TITLE_CACHE.get(cache_key)
-    if cached and (_time.time() - float(cached.get("ts", 0))) < TOPIC_CACHE_TTL_SEC:
+    if cached and (time.time() - float(cached.get("ts", 0))) < TOPIC_CACHE_TTL_SEC:
         return str(cached.get("title") or "")
 
     try:
-        result = await client(GetForumTopicsByIDRequest(peer=chat, topics=[int(topic_id)]))
+        result = await client(GetForumTopicsByIDRequest(peer=peer, topics=[int(topic_id)]))
         for topic in getattr(result, "topics", []) or []:
             if str(getattr(topic, "id", "")) == str(topic_id):
                 title = str(getattr(topic, "title", "") or "")
-                _TOPIC_TITLE_CACHE[cache_key] = {"title": title, "ts": _time.time()}
+                _cache_put(_TOPIC_TITLE_CACHE, cache_key, {"title": title, "ts": time.time()})
                 return title
     except Exception as e:
         logger.debug("解析话题标题失败 channel_id=%s topic_id=%s: %s", channel_id, topic_id, e)
 
-    _TOPIC_TITLE_CACHE[cache_key] = {"title": "", "ts": _time.time()}
+    _cache_put(_TOPIC_TITLE_CACHE, cache_key, {"title": "", "ts": time.time()})
     return ""
 
 
 def log_cpu_usage(tag=""):
     """记录CPU使用率，但限制调用频率以避免自身消耗过多CPU"""
-    global _cpu_process, _cpu_last_check
-    import time
-    
+    global _cpu_process, _cpu_last_check, _cpu_last_times, _cpu_last_mono
+
     current_time = time.time()
     # 限制CPU监控频率，避免频繁调用导致CPU峰值
     if current_time - _cpu_last_check < _cpu_check_interval:
         return
-    
+
     try:
         if _cpu_process is None:
             _cpu_process = psutil.Process(os.getpid())
-        # 使用interval=0.1而不是None，减少开销
-        cpu = _cpu_process.cpu_percent(interval=0.1)
-        logger.info(f"[CPU监控] {tag} 当前进程CPU占用: {cpu}%")
+        # 不用 cpu_percent(interval=0.1)：它会 sleep 100ms，而本函数在
+        # 事件循环里被调用，等于把整个循环卡住 100ms。
+        # 改为读 cpu_times()（一次 /proc 读取，微秒级）并与上次采样差分：
+        # 占用率 = CPU时间增量 / 墙钟增量，两次调用之间的区间均值
+        now_times = _cpu_process.cpu_times()
+        now_mono = time.monotonic()
+        if _cpu_last_times is not None:
+            dt = now_mono - _cpu_last_mono
+            if dt > 0:
+                busy = (now_times.user + now_times.system) - (
+                    _cpu_last_times.user + _cpu_last_times.system)
+                cpu = round(busy / dt * 100, 1)
+                logger.info("[CPU监控] %s 当前进程CPU占用: %s%%", tag, cpu)
+        _cpu_last_times = now_times
+        _cpu_last_mono = now_mono
         _cpu_last_check = current_time
     except Exception:
         pass  # 忽略CPU监控错误，避免影响主流程
 
 
+def _required_literal(src: str):
+    """从正则模式里提取一段必现的字面量（提不出来则返回 None）
+
+    只处理不含 |、(、[ 的模式：有分支/分组/字符类时无法静态保证某个
+    字面量一定出现。量词（? * {m,n}）会让前一个字符变为可选或重复，
+    该字符从当前字面量段中剔除；取最长一段并 lower，供 message_handler
+    在进正则引擎前先做一次廉价的子串预检。
+    """
+    if any(ch in src for ch in "|(["):
+        return None
+    runs = []
+    cur = []
+    i, n = 0, len(src)
+    while i < n:
+        ch = src[i]
+        if ch == "\\":
+            # 转义序列可能是 \d/\w 等字符类，保守地终止当前段
+            runs.append("".join(cur))
+            cur = []
+            i += 2
+            continue
+        if ch in "?*{":
+            # 量词：前一个字符可能一次都不出现，从段中剔除
+            if cur:
+                cur.pop()
+            runs.append("".join(cur))
+            cur = []
+            if ch == "{":
+                end = src.find("}", i)
+                i = end + 1 if end != -1 else n
+            else:
+                i += 1
+            continue
+        if ch in "^$.+":
+            # 锚点/通配符终止当前段；+ 的前一个字符至少出现一次，保留在段内
+            runs.append("".join(cur))
+            cur = []
+            i += 1
+            continue
+        cur.append(ch)
+        i += 1
+    runs.append("".join(cur))
+    best = max(runs, key=len) if runs else ""
+    return best.casefold() if len(best) >= 2 else None
+
+
 # -----------------------
 # default config helper
 # -----------------------
@@ -255,6 +552,12 @@ def default_config():
     }
 
 
+# 默认配置模板在导入时构建一次：
+# - 读路径（CONFIG_CACHE 尚未就绪时的兜底）直接引用，不再每次分配嵌套 dict
+# - load_config_sync 合并前 deepcopy 一份，避免污染模板
+_DEFAULT_CONFIG = default_config()
+
+
 # -----------------------
 # async-safe config loader (only reloads when file mtime changes)
 # -----------------------
@@ -262,47 +565,68 @@ def load_config_sync():
     """Synchronous file read + json load but called rarely by background task.
        We cache result in CONFIG_CACHE for message handler to use without IO.
     """
-    global CONFIG_CACHE, CONFIG_MTIME, COMPILED_ALERT_REGEX, CONFIG_PATH
+    global CONFIG_CACHE, CONFIG_SENTINEL, COMPILED_ALERT_REGEX, CONFIG_PATH
     global KEYWORDS_LC, ALERT_KEYWORDS_LC, MONITORED_CHANNELS_SET
+    global KEYWORD_AC, KEYWORD_HS, COMPILED_ALERT_REGEX_UNION, AI_TRIGGER_USERS_LC
+    global COMPILED_ALERT_REGEX_LITERALS
+    global AI_TRIGGER_ENABLED
     try:
         # 记录正在加载的配置文件路径
-        logger.info("🔍 [配置加载] 开始加载配置文件: %s", CONFIG_PATH)
+        logger.debug("🔍 [配置加载] 开始加载配置文件: %s", CONFIG_PATH)
         
-        if not os.path.exists(CONFIG_PATH):
+        # 单次 stat 同时回答 存在性/是否目录/mtime，替代 exists+isdir+getmtime 三连调用
+        st = _stat_or_none(CONFIG_PATH)
+        if st is None:
             # 仅当未显式指定 CONFIG_PATH 时才尝试备用路径
             if not CONFIG_PATH_ENV:
                 alt_path = resolve_config_path()
-                if alt_path != CONFIG_PATH and os.path.exists(alt_path):
-                    logger.warning("配置文件不存在，尝试备用路径: %s -> %s", CONFIG_PATH, alt_path)
-                    CONFIG_PATH = alt_path
-            if not os.path.exists(CONFIG_PATH):
-                CONFIG_CACHE = default_config()
-                CONFIG_MTIME = 0.0
+                if alt_path != CONFIG_PATH:
+                    alt_st = _stat_or_none(alt_path)
+                    if alt_st is not None:
+                        logger.warning("配置文件不存在，尝试备用路径: %s -> %s", CONFIG_PATH, alt_path)
+                        CONFIG_PATH = alt_path
+                        st = alt_st
+            if st is None:
+                CONFIG_CACHE = copy.deepcopy(_DEFAULT_CONFIG)
+                CONFIG_SENTINEL = (0, 0)
                 COMPILED_ALERT_REGEX = []
+                COMPILED_ALERT_REGEX_UNION = None
+                COMPILED_ALERT_REGEX_LITERALS = []
+                KEYWORD_AC = None
+                KEYWORD_HS = None
+                AI_TRIGGER_USERS_LC = frozenset()
+                AI_TRIGGER_ENABLED = False
                 logger.warning("配置文件不存在: %s，使用默认配置（待同步写入）", CONFIG_PATH)
                 return
 
         # 检查路径是否是目录（不应该发生，但如果发生需要处理）
-        if os.path.isdir(CONFIG_PATH):
+        if stat_module.S_ISDIR(st.st_mode):
             logger.error("❌ [配置加载] 配置路径是目录而不是文件: %s，无法加载配置", CONFIG_PATH)
             logger.error("   这通常是因为后端创建配置文件时出错，请检查后端日志")
             # 使用默认配置，但记录严重警告
-            CONFIG_CACHE = default_config()
-            CONFIG_MTIME = 0.0
+            CONFIG_CACHE = copy.deepcopy(_DEFAULT_CONFIG)
+            CONFIG_SENTINEL = (0, 0)
             COMPILED_ALERT_REGEX = []
+            COMPILED_ALERT_REGEX_UNION = None
+            COMPILED_ALERT_REGEX_LITERALS = []
+            KEYWORD_AC = None
+            KEYWORD_HS = None
+            AI_TRIGGER_USERS_LC = frozenset()
+            AI_TRIGGER_ENABLED = False
             logger.error("   使用默认配置（关键词检测将无法工作），请修复配置文件路径问题")
             return
 
-        mtime = os.path.getmtime(CONFIG_PATH)
-        if CONFIG_CACHE and mtime == CONFIG_MTIME:
-            logger.debug("🔍 [配置加载] 配置文件未变化，跳过重新加载: %s (mtime: %s)", CONFIG_PATH, mtime)
+        sentinel = (st.st_mtime_ns, st.st_size)
+        if CONFIG_CACHE and sentinel == CONFIG_SENTINEL:
+            logger.debug("🔍 [配置加载] 配置文件未变化，跳过重新加载: %s (sentinel: %s)", CONFIG_PATH, sentinel)
             return  # no change
 
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
+        # 按字节读入交给 orjson/json 解析（orjson 只接受 bytes/str，且显著更快）
+        with open(CONFIG_PATH, "rb") as f:
+            cfg = _json_loads(f.read())
 
         # normalize fields with defaults
-        base = default_config()
+        base = copy.deepcopy(_DEFAULT_CONFIG)
         base.update(cfg or {})
         
         # 规范化列表字段，避免 null/对象导致匹配失败
@@ -312,16 +636,43 @@ def load_config_sync():
         base["alert_regex"] = normalize_list(base.get("alert_regex"))
         
         CONFIG_CACHE = base
-        CONFIG_MTIME = mtime
+        CONFIG_SENTINEL = sentinel
+
+        # 配置文件来源的 user_id 也只在加载时解析一次 ObjectId，
+        # 写库/告警热路径直接取缓存
+        CONFIG_CACHE["_user_object_id"] = None
+        if base.get("user_id"):
+            try:
+                CONFIG_CACHE["_user_object_id"] = ObjectId(str(base["user_id"]))
+            except Exception:
+                pass
 
-        # compile regex patterns
+        # compile regex patterns（优先 re2，模式不兼容时回退 stdlib re）
+        # google-re2 没有 IGNORECASE 常量，忽略大小写要走 Options 对象
+        re2_opts = None
+        if re2 is not None:
+            re2_opts = re2.Options()
+            re2_opts.case_sensitive = False
         patterns = CONFIG_CACHE.get("alert_regex", []) or []
         COMPILED_ALERT_REGEX = []
+        COMPILED_ALERT_REGEX_LITERALS = []
         for p in patterns:
-            try:
-                COMPILED_ALERT_REGEX.append(re.compile(p, re.IGNORECASE))
-            except re.error:
-                logger.warning("无效的正则，跳过: %s", p)
+            compiled = None
+            if re2 is not None:
+                try:
+                    compiled = re2.compile(p, re2_opts)
+                except Exception:
+                    compiled = None
+            if compiled is None:
+                try:
+                    compiled = re.compile(p, re.IGNORECASE)
+                    if re2 is not None:
+                        logger.warning("正则不被 re2 支持，回退 stdlib re（注意回溯风险）: %s", p)
+                except re.error:
+                    logger.warning("无效的正则，跳过: %s", p)
+                    continue
+            COMPILED_ALERT_REGEX.append(compiled)
+            COMPILED_ALERT_REGEX_LITERALS.append(_required_literal(p))
 
         logger.info("✅ [配置加载] 配置已加载/更新：keywords=%d alert_keywords=%d regex=%d channels=%d",
                     len(CONFIG_CACHE.get("keywords", [])),
@@ -330,9 +681,82 @@ def load_config_sync():
                     len(CONFIG_CACHE.get("channels", [])))
 
         # 预计算：lowercase 关键词 + 频道集合（避免每条消息重复 lower/遍历/转换）
-        KEYWORDS_LC = [k.lower() for k in (CONFIG_CACHE.get("keywords") or []) if k and str(k).strip()]
-        ALERT_KEYWORDS_LC = [k.lower() for k in (CONFIG_CACHE.get("alert_keywords") or []) if k and str(k).strip()]
-        MONITORED_CHANNELS_SET = set((CONFIG_CACHE.get("channels") or []))
+        KEYWORDS_LC = [k.casefold() for k in (CONFIG_CACHE.get("keywords") or []) if k and str(k).strip()]
+        ALERT_KEYWORDS_LC = [k.casefold() for k in (CONFIG_CACHE.get("alert_keywords") or []) if k and str(k).strip()]
+        # 频道集合同时收录 id 的几种写法（裸 id / -100 前缀 / 负号前缀），
+        # 这样 message_handler 可以直接用 event.chat_id 做前置过滤，
+        # 不用先取实体再比较
+        channels_set = set()
+        for c in (CONFIG_CACHE.get("channels") or []):
+            c = str(c).strip()
+            if not c:
+                continue
+            channels_set.add(c)
+            bare = c.lstrip("-")
+            if bare.isdigit():
+                if c.startswith("-100"):
+                    channels_set.add(c[4:])
+                channels_set.update((bare, "-" + bare, "-100" + bare))
+        MONITORED_CHANNELS_SET = frozenset(channels_set)
+
+        # AI 触发用户的规范化（strip + lower + 集合化）也在配置加载时一次做完，
+        # message_handler 里只剩一次集合交集
+        trigger_users = (CONFIG_CACHE.get("ai_analysis") or {}).get("ai_trigger_users") or []
+        if isinstance(trigger_users, str):
+            trigger_users = [u.strip() for u in trigger_users.splitlines() if u.strip()]
+        AI_TRIGGER_USERS_LC = frozenset(
+            str(u).strip().casefold() for u in trigger_users if str(u).strip())
+        AI_TRIGGER_ENABLED = bool(
+            (CONFIG_CACHE.get("ai_analysis") or {}).get("ai_trigger_enabled", False))
+
+        # 多模式匹配：监控/告警关键词合并进单个自动机，对消息文本一次
+        # 线性扫描找出全部命中。优先 Hyperscan（SIMD DFA），其次
+        # pyahocorasick，都没有时回退逐词 in
+        KEYWORD_AC = None
+        KEYWORD_HS = None
+        if (hyperscan is not None or ahocorasick is not None) and (KEYWORDS_LC or ALERT_KEYWORDS_LC):
+            words = {}
+            for k in (CONFIG_CACHE.get("keywords") or []):
+                if k and str(k).strip():
+                    words.setdefault(str(k).casefold(), [None, None])[0] = str(k)
+            for k in (CONFIG_CACHE.get("alert_keywords") or []):
+                if k and str(k).strip():
+                    words.setdefault(str(k).casefold(), [None, None])[1] = str(k)
+            if hyperscan is not None:
+                try:
+                    pairs = list(words.items())
+                    db = hyperscan.Database()
+                    # 关键词按字面量转义后编译；文本已统一 casefold，不需要 CASELESS
+                    db.compile(
+                        expressions=[re.escape(k_lc).encode("utf-8") for k_lc, _ in pairs],
+                        ids=list(range(len(pairs))),
+                        elements=len(pairs),
+                    )
+                    KEYWORD_HS = (db, [tuple(pair) for _, pair in pairs])
+                except Exception as e:
+                    logger.warning("Hyperscan 编译关键词失败，回退 Aho-Corasick: %s", e)
+                    KEYWORD_HS = None
+            if KEYWORD_HS is None and ahocorasick is not None:
+                ac = ahocorasick.Automaton()
+                for k_lc, pair in words.items():
+                    ac.add_word(k_lc, tuple(pair))
+                ac.make_automaton()
+                KEYWORD_AC = ac
+
+        # 告警正则合并成一个大模式：没有命中时一次扫描即可排除全部
+        COMPILED_ALERT_REGEX_UNION = None
+        if COMPILED_ALERT_REGEX:
+            union_src = "|".join(f"(?:{p.pattern})" for p in COMPILED_ALERT_REGEX)
+            if re2 is not None:
+                try:
+                    COMPILED_ALERT_REGEX_UNION = re2.compile(union_src, re2_opts)
+                except Exception:
+                    COMPILED_ALERT_REGEX_UNION = None
+            if COMPILED_ALERT_REGEX_UNION is None:
+                try:
+                    COMPILED_ALERT_REGEX_UNION = re.compile(union_src, re.IGNORECASE)
+                except re.error:
+                    COMPILED_ALERT_REGEX_UNION = None
         
         # 详细日志：显示关键词内容（仅在有关键词时）
         if CONFIG_CACHE.get("keywords"):
@@ -345,22 +769,29 @@ def load_config_sync():
             logger.info("🔔 [配置加载] 告警关键词: 无")
     except Exception as e:
         logger.exception("加载配置失败: %s", e)
-        CONFIG_CACHE = default_config()
+        CONFIG_CACHE = copy.deepcopy(_DEFAULT_CONFIG)
         COMPILED_ALERT_REGEX = []
+        COMPILED_ALERT_REGEX_UNION = None
+        COMPILED_ALERT_REGEX_LITERALS = []
+        KEYWORD_AC = None
+        KEYWORD_HS = None
+        AI_TRIGGER_USERS_LC = frozenset()
+        AI_TRIGGER_ENABLED = False
 
 
 async def config_reloader_task():
     """后台任务：定期检查配置文件是否变化并加载（同步 IO，但很低频）"""
-    loop = asyncio.get_event_loop()
     while not SHUTDOWN.is_set():
         try:
-            # import time
-            # start_time = time.time()
-            # run synchronous loader on loop's executor to avoid blocking event loop if file read is slow
-            await loop.run_in_executor(None, load_config_sync)
-            # elapsed = time.time() - start_time
-            # if elapsed > 0.1:  # 只记录耗时超过100ms的操作
-            #     logger.warning(f"[性能监控] 配置重载任务耗时: {elapsed:.3f}秒")
+            # mtime 检查只是一次 stat 系统调用（微秒级），直接在事件循环里做；
+            # 只有文件确实变化（或还没有缓存）时才把 读文件+json解析+预计算
+            # 丢进线程，常见的“无变化”轮询不再有线程池往返
+            st = _stat_or_none(CONFIG_PATH)
+            if st is None or not CONFIG_CACHE or (st.st_mtime_ns, st.st_size) != CONFIG_SENTINEL:
+                # 配置文件只有几 KB：读+解析耗时微秒级，直接在协程里做，
+                # 省掉线程池往返和 GIL 交接（哨兵未变时根本走不到这里）
+                load_config_sync()
+                _maybe_reregister_message_handler()
         except Exception as e:
             logger.exception("配置重载任务异常: %s", e)
         # 使用asyncio.sleep而不是wait，更高效
@@ -370,10 +801,47 @@ async def config_reloader_task():
 # -----------------------
 # HTTP helpers (aiohttp)
 # -----------------------
-async def get_json(url: str, timeout: int = 10, silent: bool = False) -> Optional[dict]:
+@functools.lru_cache(maxsize=16)
+def _client_timeout(total: int) -> "aiohttp.ClientTimeout":
+    """按超时秒数缓存 ClientTimeout 对象，热路径不再每次请求重新构造"""
+    return aiohttp.ClientTimeout(total=total)
+
+
+# 简易熔断器：后端宕机时每个请求都要等到超时（10-120s），会把告警/AI
+# worker 全部占死。连续失败 _BREAKER_THRESHOLD 次后打开熔断，冷却期内
+# 直接返回 None（微秒级），冷却结束放行一个请求试探（half-open）
+_BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", "5"))
+_BREAKER_COOLDOWN = float(os.getenv("HTTP_BREAKER_COOLDOWN", "30"))
+_breaker_fails = 0
+_breaker_open_until = 0.0
+
+
+def _breaker_is_open() -> bool:
+    return time.monotonic() < _breaker_open_until
+
+
+def _breaker_record(ok: bool):
+    global _breaker_fails, _breaker_open_until
+    if ok:
+        if _breaker_fails:
+            logger.info("后端恢复，熔断器复位（此前连续失败 %d 次）", _breaker_fails)
+        _breaker_fails = 0
+        _breaker_open_until = 0.0
+    else:
+        _breaker_fails += 1
+        if _breaker_fails >= _BREAKER_THRESHOLD:
+            _breaker_open_until = time.monotonic() + _BREAKER_COOLDOWN
+            logger.warning("后端连续失败 %d 次，熔断 %.0f 秒内的内部 API 调用",
+                           _breaker_fails, _BREAKER_COOLDOWN)
+
+
+async def _request(method: str, url: str, payload: Optional[dict] = None,
+                   timeout: int = 10, silent: bool = False) -> Optional[dict]:
     """
-    发送 GET 请求
+    GET/POST 共用的请求核心
+    :param method: "GET" 或 "POST"
     :param url: 请求 URL
+    :param payload: POST 请求数据（GET 传 None）
     :param timeout: 超时时间（秒）
     :param silent: 如果为 True，连接失败时不记录 ERROR（仅 DEBUG），用于可选的辅助功能
     :return: 响应数据或 None
@@ -381,151 +849,80 @@ async def get_json(url: str, timeout: int = 10, silent: bool = False) -> Optiona
     global http_session
     if http_session is None:
         raise RuntimeError("HTTP session not initialized")
+    if _breaker_is_open():
+        if not silent:
+            logger.debug("%s %s 被熔断器拦截（后端疑似不可用）", method, url)
+        return None
     try:
         headers = {}
         if INTERNAL_API_TOKEN:
             headers["X-Internal-Token"] = INTERNAL_API_TOKEN
-        async with http_session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), headers=headers) as resp:
-            text = await resp.text()
+        async with http_session.request(method, url, json=payload,
+                                        timeout=_client_timeout(timeout), headers=headers,
+                                        allow_redirects=False, read_bufsize=8192) as resp:
+            # 只读一次原始字节，直接交给 orjson/json 解析，
+            # 跳过 resp.text()+resp.json() 的两次解码
+            body = await resp.read()
+            # 只要后端有响应（含 4xx）就视为存活；5xx 计入熔断失败
+            _breaker_record(resp.status < 500)
             if resp.status == 200:
                 try:
-                    return await resp.json()
+                    return _json_loads(body)
                 except Exception:
-                    return {"raw": text}
+                    return {"raw": body.decode(errors="replace")}
             else:
                 if not silent:
-                    logger.warning("GET %s 返回 %s: %s", url, resp.status, text[:200])
+                    logger.warning("%s %s 返回 %s: %s", method, url, resp.status,
+                                   body[:200].decode(errors="replace"))
                 return None
     except asyncio.CancelledError:
         raise
-    except (aiohttp.client_exceptions.ClientConnectorError, 
+    except (aiohttp.client_exceptions.ClientConnectorError,
             aiohttp.client_exceptions.ClientConnectorDNSError) as e:
+        _breaker_record(False)
+        # 连接错误（DNS解析失败、无法连接等）- 根据 silent 参数决定日志级别
         if silent:
-            logger.debug("GET 请求失败（静默模式）: %s %s", url, str(e)[:100])
+            logger.debug("%s 请求失败（静默模式）: %s %s", method, url, str(e)[:100])
         else:
-            logger.warning("GET 请求失败（连接错误）: %s %s", url, str(e)[:100])
+            logger.warning("%s 请求失败（连接错误）: %s %s", method, url, str(e)[:100])
         return None
     except Exception as e:
+        _breaker_record(False)
         if not silent:
-            logger.exception("GET 请求失败: %s %s", url, e)
+            logger.exception("%s 请求失败: %s %s", method, url, e)
         else:
-            logger.debug("GET 请求失败（静默模式）: %s %s", url, str(e)[:100])
+            logger.debug("%s 请求失败（静默模式）: %s %s", method, url, str(e)[:100])
         return None
 
 
 async def get_json(url: str, timeout: int = 10, silent: bool = False) -> Optional[dict]:
-    """
-    发送 GET 请求
-    :param url: 请求 URL
-    :param timeout: 超时时间（秒）
-    :param silent: 如果为 True，连接失败时不记录 ERROR（仅 DEBUG），用于可选的辅助功能
-    :return: 响应数据或 None
-    """
-    global http_session
-    if http_session is None:
-        raise RuntimeError("HTTP session not initialized")
-    try:
-        headers = {}
-        if INTERNAL_API_TOKEN:
-            headers["X-Internal-Token"] = INTERNAL_API_TOKEN
-        async with http_session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), headers=headers) as resp:
-            text = await resp.text()
-            if resp.status == 200:
-                try:
-                    return await resp.json()
-                except Exception:
-                    return {"raw": text}
-            else:
-                if not silent:
-                    logger.warning("GET %s 返回 %s: %s", url, resp.status, text[:200])
-                return None
-    except asyncio.CancelledError:
-        raise
-    except (aiohttp.client_exceptions.ClientConnectorError, 
-            aiohttp.client_exceptions.ClientConnectorDNSError) as e:
-        if silent:
-            logger.debug("GET 请求失败（静默模式）: %s %s", url, str(e)[:100])
-        else:
-            logger.warning("GET 请求失败（连接错误）: %s %s", url, str(e)[:100])
-        return None
-    except Exception as e:
-        if not silent:
-            logger.exception("GET 请求失败: %s %s", url, e)
-        else:
-            logger.debug("GET 请求失败（静默模式）: %s %s", url, str(e)[:100])
-        return None
+    """发送 GET 请求（见 _request）"""
+    return await _request("GET", url, timeout=timeout, silent=silent)
 
 
 async def post_json(url: str, payload: dict, timeout: int = 10, silent: bool = False) -> Optional[dict]:
-    """
-    发送 POST 请求
-    :param url: 请求 URL
-    :param payload: 请求数据
-    :param timeout: 超时时间（秒）
-    :param silent: 如果为 True，连接失败时不记录 ERROR（仅 DEBUG），用于可选的辅助功能
-    :return: 响应数据或 None
-    """
-    global http_session
-    if http_session is None:
-        raise RuntimeError("HTTP session not initialized")
-    try:
-        headers = {}
-        if INTERNAL_API_TOKEN:
-            headers["X-Internal-Token"] = INTERNAL_API_TOKEN
-        async with http_session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout), headers=headers) as resp:
-            text = await resp.text()
-            if resp.status == 200:
-                try:
-                    return await resp.json()
-                except Exception:
-                    return {"raw": text}
-            else:
-                if not silent:
-                    logger.warning("POST %s 返回 %s: %s", url, resp.status, text[:200])
-                return None
-    except asyncio.CancelledError:
-        raise
-    except (aiohttp.client_exceptions.ClientConnectorError, 
-            aiohttp.client_exceptions.ClientConnectorDNSError) as e:
-        # 连接错误（DNS解析失败、无法连接等）- 根据 silent 参数决定日志级别
-        if silent:
-            logger.debug("POST 请求失败（静默模式）: %s %s", url, str(e)[:100])
-        else:
-            logger.warning("POST 请求失败（连接错误）: %s %s", url, str(e)[:100])
-        return None
-    except Exception as e:
-        if not silent:
-            logger.exception("POST 请求失败: %s %s", url, e)
-        else:
-            logger.debug("POST 请求失败（静默模式）: %s %s", url, str(e)[:100])
-        return None
+    """发送 POST 请求（见 _request）"""
+    return await _request("POST", url, payload=payload, timeout=timeout, silent=silent)
 
 
 # -----------------------
 # async DB write
 # -----------------------
-async def save_log_async(channel, channel_id, sender, message, keywords, message_id, channel_username="", channel_type="", topic_id="", topic_title="", sender_id=""):
+async def save_log_async(channel, channel_id, sender, message, keywords, message_id, channel_username="", channel_type="", topic_id="", topic_title="", sender_id="", when=None, ensure_persisted=False):
+    """保存日志。默认只入批量写队列并立即返回预生成的 log_id；
+    ensure_persisted=True 时改为带确认的内联 insert_one——AI 触发路径
+    的后端 analyze-now 拿到 log_id 会立刻 findById，这条必须先落库"""
     try:
-        from bson import ObjectId
-        
-        # 获取userId，如果没有设置则尝试从配置中获取或使用默认值
-        userId = None
-        if USER_ID:
-            try:
-                userId = ObjectId(USER_ID)
-            except Exception:
-                logger.warning("无效的USER_ID环境变量: %s，将尝试从配置获取", USER_ID)
-        
-        # 如果环境变量中没有，尝试从配置中获取
+        # 获取userId：环境变量的 ObjectId 已在模块加载时解析并缓存
+        userId = _USER_OBJECTID
+        if USER_ID and userId is None:
+            logger.warning("无效的USER_ID环境变量: %s，将尝试从配置获取", USER_ID)
+
+        # 如果环境变量中没有，尝试从配置中获取（ObjectId 已在配置加载时解析）
         if not userId:
-            config = CONFIG_CACHE or default_config()
-            config_user_id = config.get("user_id")
-            if config_user_id:
-                try:
-                    userId = ObjectId(config_user_id)
-                except Exception:
-                    pass
-        
+            config = CONFIG_CACHE or _DEFAULT_CONFIG
+            userId = config.get("_user_object_id")
+
         # 如果还是没有，记录警告（但继续保存，后端会处理）
         if not userId:
             logger.warning("未设置USER_ID，日志将无法关联到用户。请在环境变量中设置USER_ID或在配置文件中设置user_id")
@@ -541,7 +938,8 @@ async def save_log_async(channel, channel_id, sender, message, keywords, message
             "senderId": str(sender_id or ""),
             "message": message,
             "keywords": keywords if isinstance(keywords, list) else [keywords],
-            "time": datetime.utcnow(),
+            # when：调用方（message_handler）在收到消息时取过一次 utcnow，复用它
+            "time": when or datetime.utcnow(),
             "messageId": message_id,
             "alerted": bool(keywords),
             "ai_analyzed": False
@@ -550,66 +948,151 @@ async def save_log_async(channel, channel_id, sender, message, keywords, message
         # 如果有userId，添加到文档中
         if userId:
             doc["userId"] = userId
-        
-        res = await logs_collection.insert_one(doc)
-        return str(res.inserted_id)
+
+        # 客户端预生成 _id，入队后立即返回 log_id，调用方（SSE 通知）
+        # 不用等实际写库；真正的插入由 log_batch_writer_task 批量完成
+        doc["_id"] = ObjectId()
+        if ensure_persisted:
+            # 不能等批量窗口（最长 LOG_BATCH_WINDOW_MS），否则消费 log_id
+            # 的一方会在文档落库前读到空
+            await logs_collection.insert_one(doc)
+        else:
+            await _log_queue.put(doc)
+        return str(doc["_id"])
     except Exception as e:
         logger.exception("保存日志失败: %s", e)
         return None
 
 
+async def _flush_log_batch(docs):
+    """批量写入 Mongo：一次 insert_many 往返摊薄到 N 条消息上
+
+    告警命中的日志走默认 write concern（等服务器确认，不能丢）；
+    全量审计日志（绝大多数）走 w=0，省确认往返
+    """
+    if not docs:
+        return
+    alerted = [d for d in docs if d.get("alerted")]
+    bulk = [d for d in docs if not d.get("alerted")]
+    try:
+        if alerted:
+            await logs_collection.insert_many(alerted, ordered=False)
+        if bulk:
+            await fast_logs_collection.insert_many(bulk, ordered=False)
+    except Exception as e:
+        logger.exception("批量保存日志失败（%d 条）: %s", len(docs), e)
+
+
+async def log_batch_writer_task():
+    """后台批量写库任务：攒满 LOG_BATCH_MAX 条或到时间窗就 flush。"""
+    window = max(10, LOG_BATCH_WINDOW_MS) / 1000.0
+    while True:
+        docs = []
+        try:
+            docs.append(await _log_queue.get())
+            deadline = time.monotonic() + window
+            while len(docs) < LOG_BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    docs.append(await asyncio.wait_for(_log_queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            await _flush_log_batch(docs)
+        except asyncio.CancelledError:
+            # 退出前把手里这批和队列里剩余的都写掉，不丢日志
+            while not _log_queue.empty():
+                docs.append(_log_queue.get_nowait())
+            await _flush_log_batch(docs)
+            break
+        except Exception:
+            # 不让后台任务死掉
+            await asyncio.sleep(0.5)
+
+
 # -----------------------
 # AI 分析（异步队列）
 # -----------------------
+# 结果消息模板提到模块级：每次分析只做一次 format，不再重建整段 f-string
+_AI_SUMMARY_TEMPLATE = (
+    "🤖 AI 分析结果\n\n"
+    "📊 分析消息数: {count}\n\n"
+    "整体情感: {sentiment} (score={score})\n\n"
+    "风险等级: {risk}\n\n"
+    "摘要:\n{summary}\n\n"
+    "关键词: {keywords}"
+)
 async def trigger_ai_analysis_async(sender_id, client, log_id=None):
     # 移除频繁的CPU监控调用
     # log_cpu_usage("AI分析开始")
-    """通过异步 HTTP 调用内部 AI 接口，并把结果发回给用户（限制并发）"""
-    async with ai_semaphore:
-        try:
-            payload = {"trigger_type": "user_message"}
-            if log_id:
-                payload["log_id"] = log_id
-            logger.info("触发 AI 分析: log_id=%s", log_id)
-            result = await post_json(f"{API_URL}/api/internal/ai/analyze-now", payload, timeout=120)
-            if not result:
-                logger.warning("AI 分析无结果")
-                return
-            if result.get("success"):
-                analysis = result.get("analysis", {})
-                is_plain = analysis.get("format") == "plain"
-                if is_plain:
-                    # 自定义提示词自由模式：直接把 AI 生成的成品文本发给用户
-                    summary = analysis.get("summary", "无")
-                    if result.get("message_count"):
-                        summary = f"🤖 AI 分析结果（{result.get('message_count')}条）\n\n{summary}"
-                else:
-                    summary = (
-                        "🤖 AI 分析结果\n\n"
-                        f"📊 分析消息数: {result.get('message_count', 0)}\n\n"
-                        f"整体情感: {analysis.get('sentiment', 'unknown')} (score={analysis.get('sentiment_score', 0)})\n\n"
-                        f"风险等级: {analysis.get('risk_level', 'unknown')}\n\n"
-                        f"摘要:\n{analysis.get('summary', '无')}\n\n"
-                        f"关键词: {', '.join(analysis.get('keywords', []))}"
-                    )
-                try:
-                    # 发送给用户（非阻塞）
-                    await client.send_message(int(sender_id), summary)
-                    logger.info("AI 分析结果已发送给 %s", sender_id)
-                    return True
-                except Exception as e:
-                    logger.exception("发送 AI 结果失败: %s", e)
+    """通过异步 HTTP 调用内部 AI 接口，并把结果发回给用户（并发由 worker 池限定）"""
+    try:
+        payload = {"trigger_type": "user_message"}
+        if log_id:
+            payload["log_id"] = log_id
+        logger.info("触发 AI 分析: log_id=%s", log_id)
+        result = await post_json(f"{API_URL}/api/internal/ai/analyze-now", payload, timeout=120)
+        if not result:
+            logger.warning("AI 分析无结果")
+            return
+        if result.get("success"):
+            analysis = result.get("analysis", {})
+            is_plain = analysis.get("format") == "plain"
+            if is_plain:
+                # 自定义提示词自由模式：直接把 AI 生成的成品文本发给用户
+                summary = analysis.get("summary", "无")
+                if result.get("message_count"):
+                    summary = f"🤖 AI 分析结果（{result.get('message_count')}条）\n\n{summary}"
             else:
-                logger.warning("AI 分析返回失败: %s", result.get("error"))
+                summary = _AI_SUMMARY_TEMPLATE.format(
+                    count=result.get('message_count', 0),
+                    sentiment=analysis.get('sentiment', 'unknown'),
+                    score=analysis.get('sentiment_score', 0),
+                    risk=analysis.get('risk_level', 'unknown'),
+                    summary=analysis.get('summary', '无'),
+                    keywords=', '.join(analysis.get('keywords', [])),
+                )
+            try:
+                # 发送给用户（非阻塞）
+                await client.send_message(int(sender_id), summary)
+                logger.info("AI 分析结果已发送给 %s", sender_id)
+                return True
+            except Exception as e:
+                logger.exception("发送 AI 结果失败: %s", e)
+        else:
+            logger.warning("AI 分析返回失败: %s", result.get("error"))
+    except Exception as e:
+        logger.exception("触发 AI 分析异常: %s", e)
+    return False
+
+
+def enqueue_ai_analysis(sender_id, client, log_id=None):
+    """AI 分析入队（非阻塞）。队列满时丢弃本次触发并计数。"""
+    global _ai_dropped
+    try:
+        _ai_queue.put_nowait((sender_id, client, log_id))
+    except asyncio.QueueFull:
+        _ai_dropped += 1
+        logger.warning("AI 分析队列已满，丢弃触发（累计 %d 次）: log_id=%s", _ai_dropped, log_id)
+
+
+async def ai_worker_task():
+    """AI 分析 worker：固定 AI_CONCURRENCY 个，从队列取任务串行执行"""
+    while True:
+        try:
+            sender_id, client, log_id = await _ai_queue.get()
+            await trigger_ai_analysis_async(sender_id, client, log_id)
+        except asyncio.CancelledError:
+            break
         except Exception as e:
-            logger.exception("触发 AI 分析异常: %s", e)
-        return False
+            logger.exception("AI worker 异常: %s", e)
 
 
 # -----------------------
 # 消息通知（异步，触发前端SSE推送）
 # -----------------------
-async def notify_new_message_async(log_id, channel, channel_id, sender, message, keywords, alerted, channel_username="", channel_type="", topic_id="", topic_title="", sender_id=""):
+async def notify_new_message_async(log_id, channel, channel_id, sender, message, keywords, alerted, channel_username="", channel_type="", topic_id="", topic_title="", sender_id="", when=None):
     """通知后端有新消息，触发SSE推送（非阻塞，不等待结果）"""
     try:
         # 尽量把 userId 一并传给后端，避免后端每条消息都 Log.findById 查 userId（高 CPU/IO）
@@ -617,7 +1100,7 @@ async def notify_new_message_async(log_id, channel, channel_id, sender, message,
         if USER_ID:
             user_id_str = USER_ID
         else:
-            cfg = CONFIG_CACHE or default_config()
+            cfg = CONFIG_CACHE or _DEFAULT_CONFIG
             if cfg.get("user_id"):
                 user_id_str = str(cfg.get("user_id"))
 
@@ -634,7 +1117,7 @@ async def notify_new_message_async(log_id, channel, channel_id, sender, message,
             "senderId": str(sender_id or ""),
             "message": message,
             "keywords": keywords if isinstance(keywords, list) else [keywords] if keywords else [],
-            "time": datetime.utcnow().isoformat(),
+            "time": (when or datetime.utcnow()).isoformat(),
             "alerted": alerted
         }
         # 批量发送：降低 HTTP QPS/CPU，默认只增加 ~200ms 延迟
@@ -714,47 +1197,64 @@ async def message_notify_batch_worker():
 # 告警发送（异步）
 # -----------------------
 async def send_alert_async(keyword, message, sender, channel, channel_id, message_id):
-    async with alert_semaphore:
-        # 获取userId用于告警推送
-        userId = None
-        if USER_ID:
-            try:
-                from bson import ObjectId
-                userId = str(ObjectId(USER_ID))
-            except Exception:
-                pass
-        
-        # 如果配置文件中有user_id，也尝试获取
-        if not userId:
-            config = CONFIG_CACHE or default_config()
-            config_user_id = config.get("user_id")
-            if config_user_id:
-                try:
-                    from bson import ObjectId
-                    userId = str(ObjectId(config_user_id))
-                except Exception:
-                    pass
-        
-        payload = {
-            "keyword": keyword,
-            "message": message,
-            "from": sender,
-            "channel": channel,
-            "channelId": str(channel_id),
-            "messageId": message_id
-        }
-        
-        # 如果有userId，添加到payload中
-        if userId:
-            payload["userId"] = userId
-        
-        logger.info("发送告警到 API: %s (userId: %s)", keyword, userId or "未设置")
-        # 使用内部API，不需要认证
-        result = await post_json(f"{API_URL}/api/internal/alert/push", payload, timeout=10)
-        if result is not None:
-            logger.info("告警发送成功: %s", keyword)
-        else:
-            logger.warning("告警发送失败: %s", keyword)
+    # 获取userId用于告警推送（环境变量/配置的 ObjectId 都已提前解析缓存）
+    userId = _USER_OBJECTID_STR
+
+    # 如果配置文件中有user_id，也尝试获取
+    if not userId:
+        config = CONFIG_CACHE or _DEFAULT_CONFIG
+        config_oid = config.get("_user_object_id")
+        userId = str(config_oid) if config_oid else None
+
+    payload = {
+        "keyword": keyword,
+        "message": message,
+        "from": sender,
+        "channel": channel,
+        "channelId": str(channel_id),
+        "messageId": message_id
+    }
+
+    # 如果有userId，添加到payload中
+    if userId:
+        payload["userId"] = userId
+
+    logger.info("发送告警到 API: %s (userId: %s)", keyword, userId or "未设置")
+    # 使用内部API，不需要认证
+    result = await post_json(f"{API_URL}/api/internal/alert/push", payload, timeout=10)
+    if result is not None:
+        logger.info("告警发送成功: %s", keyword)
+    else:
+        logger.warning("告警发送失败: %s", keyword)
+
+
+def enqueue_alert(keyword, message, sender, channel, channel_id, message_id):
+    """告警入队（非阻塞）。队列满时丢最旧的一条，优先保留最新告警。"""
+    args = (keyword, message, sender, channel, channel_id, message_id)
+    try:
+        _alert_queue.put_nowait(args)
+    except asyncio.QueueFull:
+        try:
+            dropped = _alert_queue.get_nowait()
+            logger.warning("告警队列已满，丢弃最旧告警: %s", dropped[0])
+        except asyncio.QueueEmpty:
+            pass
+        try:
+            _alert_queue.put_nowait(args)
+        except asyncio.QueueFull:
+            pass
+
+
+async def alert_worker_task():
+    """告警 worker：固定 ALERT_CONCURRENCY 个，复用 keep-alive 连接池"""
+    while True:
+        try:
+            args = await _alert_queue.get()
+            await send_alert_async(*args)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.exception("告警 worker 异常: %s", e)
 
 
 # -----------------------
@@ -773,9 +1273,9 @@ async def send_telegram_message_async(target: str, message: str, topic_id: str =
         return False
     
     try:
-        logger.info("🔍 [消息发送] 检查客户端连接状态...")
+        logger.debug("🔍 [消息发送] 检查客户端连接状态...")
         if not telegram_client.is_connected():
-            logger.info("🔍 [消息发送] 客户端未连接，正在连接...")
+            logger.debug("🔍 [消息发送] 客户端未连接，正在连接...")
             await telegram_client.connect()
             logger.info("✅ [消息发送] 客户端已连接")
         else:
@@ -808,7 +1308,7 @@ async def send_telegram_message_async(target: str, message: str, topic_id: str =
             target_candidates.append(clean_target)
 
         # 尝试通过用户名、手机号或数字 ID 获取实体
-        logger.info("🔍 [消息发送] 正在查找目标: %s", clean_target)
+        logger.debug("🔍 [消息发送] 正在查找目标: %s", clean_target)
         entity = None
         last_error = None
 
@@ -816,7 +1316,7 @@ async def send_telegram_message_async(target: str, message: str, topic_id: str =
             nonlocal entity, last_error
             for candidate in target_candidates:
                 try:
-                    logger.info("🔍 [消息发送] 尝试解析目标候选: %s (类型: %s)", candidate, type(candidate).__name__)
+                    logger.debug("🔍 [消息发送] 尝试解析目标候选: %s (类型: %s)", candidate, type(candidate).__name__)
                     entity = await telegram_client.get_entity(candidate)
                     logger.info("✅ [消息发送] 找到目标实体: %s (ID: %s)", getattr(entity, 'username', None) or getattr(entity, 'first_name', None) or getattr(entity, 'title', None) or 'Unknown', getattr(entity, 'id', 'Unknown'))
                     return True
@@ -845,7 +1345,6 @@ async def send_telegram_message_async(target: str, message: str, topic_id: str =
         return True
     except Exception as e:
         logger.error("❌ [消息发送] 发送Telegram消息失败: %s (类型: %s)", str(e), type(e).__name__)
-        import traceback
         logger.error("   错误堆栈: %s", traceback.format_exc())
         return False
 
@@ -876,7 +1375,7 @@ async def handle_send_telegram(request):
         
         # 处理目标格式（如果包含 @ 符号，保留它；Telegram API 支持带 @ 的用户名）
         clean_target = str(target).strip()
-        logger.info("🔍 [消息发送] 准备发送消息到: %s", clean_target)
+        logger.debug("🔍 [消息发送] 准备发送消息到: %s", clean_target)
         
         success = await send_telegram_message_async(clean_target, message, topic_id)
         if success:
@@ -900,9 +1399,9 @@ async def handle_config_reload(request):
             if token != INTERNAL_API_TOKEN:
                 return web.json_response({"error": "forbidden"}, status=403)
 
-        # 立即重新加载配置
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, load_config_sync)
+        # 立即重新加载配置（小文件，直接同步调用，无需线程池）
+        load_config_sync()
+        _maybe_reregister_message_handler()
         logger.info("✅ 收到配置重载通知，配置已立即重新加载")
         return web.json_response({"status": "ok", "message": "配置已重新加载"})
     except Exception as e:
@@ -913,7 +1412,46 @@ async def handle_config_reload(request):
 # -----------------------
 # 消息处理器（非阻塞 / 轻量）
 # -----------------------
-async def message_handler(event, client):
+_message_handler_cb = None  # 当前注册的回调，供重新注册时 remove 用
+_handler_chats_key = None   # 注册时的 channels 配置快照，用于检测变化
+
+
+def _register_message_handler(client):
+    """注册 NewMessage 事件处理器。
+
+    - outgoing=False：只监控收到的消息，防止告警消息触发关键词匹配形成循环
+    - func=…raw_text：空文本（纯媒体）消息在分发前就被 Telethon 丢掉
+    - chats=…：配置了纯数字频道列表时交给 Telethon 预过滤，非监控对话
+      连 handler 都不进；含用户名等非数字项时退回 handler 内的 chat_id 过滤
+    """
+    global _message_handler_cb, _handler_chats_key
+    channels = tuple((CONFIG_CACHE or {}).get("channels") or [])
+    chats = None
+    if channels and all(str(c).strip().lstrip("-").isdigit() for c in channels):
+        chats = [int(str(c).strip()) for c in channels]
+    if _message_handler_cb is not None:
+        client.remove_event_handler(_message_handler_cb)
+    # functools.partial 预绑定 client，比 lambda 少一层每条消息都要新建的闭包帧
+    cb = functools.partial(message_handler, client=client)
+    client.add_event_handler(cb, events.NewMessage(
+        outgoing=False, chats=chats, func=lambda e: bool(e.raw_text)))
+    _message_handler_cb = cb
+    _handler_chats_key = channels
+    logger.info("✅ [事件注册] 已注册 NewMessage 事件处理器（chats 预过滤: %s）",
+                "启用(%d)" % len(chats) if chats else "未启用")
+
+
+def _maybe_reregister_message_handler():
+    """配置重载后若 channels 变化，重新注册 handler 以同步 chats= 预过滤"""
+    client = telegram_client
+    if client is None or _message_handler_cb is None:
+        return
+    channels = tuple((CONFIG_CACHE or {}).get("channels") or [])
+    if channels != _handler_chats_key:
+        _register_message_handler(client)
+
+
+async def message_handler(event, client=None):
     # 默认不在 INFO 打每条消息日志（高吞吐时非常吃 CPU），仅在 debug_verbose_message_logs 开启时输出
     # logger.info("🔔 [消息处理] 收到事件，开始处理...")
     
@@ -925,7 +1463,7 @@ async def message_handler(event, client):
         message_event_time = getattr(event.message, 'date', None) if hasattr(event, 'message') and event.message else None
         
         # use cached config only (no IO here)
-        config = CONFIG_CACHE or default_config()
+        config = CONFIG_CACHE or _DEFAULT_CONFIG
         log_all = bool(config.get("log_all_messages", True))
         verbose_logs = bool(config.get("debug_verbose_message_logs", False))
 
@@ -936,54 +1474,87 @@ async def message_handler(event, client):
             return
 
         # 降 CPU：只做一次 lower，后续关键词匹配复用
-        text_lc = text.lower()
+        # casefold 比 lower 多覆盖一批 Unicode 折叠（如 ß→ss），全链路统一用它
+        text_lc = text.casefold()
 
         if verbose_logs:
             logger.info("📨 [消息接收] 收到新消息，长度: %d 字符", len(text))
 
-        chat = await event.get_chat()
-        channel_id = str(chat.id)
-        chat_title = getattr(chat, "title", None)
-        chat_username = getattr(chat, "username", None)
-        chat_first_name = getattr(chat, "first_name", None)
-        chat_last_name = getattr(chat, "last_name", None)
-
-        # 统一对话显示名：
-        # - 频道/群：优先 title
-        # - 私聊用户：优先 first_name/last_name（不附带 @username）
-        # - 兜底：username / Unknown
-        if chat_title:
-            channel_name = chat_title
+        # 频道过滤前移：event.chat_id 是事件自带属性（无 RPC），不在监控列表的
+        # 消息在做任何实体解析/发送者补全之前直接丢弃
+        # （集合在配置加载时已收录 id 的各种写法，见 load_config_sync）
+        event_chat_id = getattr(event, "chat_id", None)
+        if MONITORED_CHANNELS_SET and event_chat_id is not None \
+                and str(event_chat_id) not in MONITORED_CHANNELS_SET:
+            if verbose_logs:
+                logger.info("⏭️  [频道过滤] chat_id=%s 不在监控列表中，跳过消息", event_chat_id)
+            return
+
+        # 对话信息带 TTL 缓存：命中则完全跳过 event.get_chat()（可能触发 RPC）
+        chat = None
+        chat_cached = _CHAT_INFO_CACHE.get(str(event_chat_id)) if event_chat_id else None
+        if chat_cached and (time.time() - chat_cached["ts"]) < CHAT_CACHE_TTL_SEC:
+            channel_id = chat_cached["channel_id"]
+            channel_name = chat_cached["channel_name"]
+            channel_username = chat_cached["channel_username"]
+            channel_type = chat_cached["channel_type"]
         else:
-            chat_full_name = " ".join([n for n in [chat_first_name, chat_last_name] if n]) if (chat_first_name or chat_last_name) else None
-            if chat_full_name:
-                channel_name = chat_full_name
-            elif chat_username:
-                channel_name = chat_username
+            chat = await event.get_chat()
+            channel_id = str(chat.id)
+            chat_title = getattr(chat, "title", None)
+            chat_username = getattr(chat, "username", None)
+            chat_first_name = getattr(chat, "first_name", None)
+            chat_last_name = getattr(chat, "last_name", None)
+
+            # 统一对话显示名：
+            # - 频道/群：优先 title
+            # - 私聊用户：优先 first_name/last_name（不附带 @username）
+            # - 兜底：username / Unknown
+            if chat_title:
+                channel_name = chat_title
             else:
-                channel_name = "Unknown"
+                chat_full_name = " ".join([n for n in [chat_first_name, chat_last_name] if n]) if (chat_first_name or chat_last_name) else None
+                if chat_full_name:
+                    channel_name = chat_full_name
+                elif chat_username:
+                    channel_name = chat_username
+                else:
+                    channel_name = "Unknown"
+
+            channel_username = chat_username or ""
+            channel_type = type(chat).__name__
+            if event_chat_id:
+                _cache_put(_CHAT_INFO_CACHE, str(event_chat_id), {
+                    "channel_id": channel_id,
+                    "channel_name": channel_name,
+                    "channel_username": channel_username,
+                    "channel_type": channel_type,
+                    "ts": time.time(),
+                })
+            # 记录对话解析详情，便于理解“频道/对话名”为何显示为 username
+            try:
+                logger.info(
+                    "🔍 [对话解析] chat_id=%s chat_type=%s title=%s username=%s first_name=%s last_name=%s => channel_name=%s",
+                    getattr(chat, "id", None),
+                    type(chat).__name__,
+                    chat_title,
+                    chat_username,
+                    chat_first_name,
+                    chat_last_name,
+                    channel_name,
+                )
+            except Exception:
+                pass
 
-        channel_username = chat_username or ""
-        channel_type = type(chat).__name__
         topic_id = extract_topic_id_from_message(getattr(event, "message", None))
-        topic_title = await resolve_topic_title(client, chat, topic_id) if topic_id else ""
-        # 记录对话解析详情，便于理解“频道/对话名”为何显示为 username
-        try:
-            logger.info(
-                "🔍 [对话解析] chat_id=%s chat_type=%s title=%s username=%s first_name=%s last_name=%s => channel_name=%s",
-                getattr(chat, "id", None),
-                type(chat).__name__,
-                chat_title,
-                chat_username,
-                chat_first_name,
-                chat_last_name,
-                channel_name,
-            )
-        except Exception:
-            pass
+        topic_title = ""
+        if topic_id:
+            # 缓存命中时没有完整实体，用 get_input_chat()（session 内查找，通常无 RPC）
+            topic_peer = chat if chat is not None else await event.get_input_chat()
+            topic_title = await resolve_topic_title(client, topic_peer, channel_id, topic_id)
 
         # check channel filter（channels 在 load_config_sync 已 normalize 为字符串）
-        channel_id_str = str(chat.id)
+        channel_id_str = channel_id
         if MONITORED_CHANNELS_SET:
             if channel_id_str not in MONITORED_CHANNELS_SET:
                 if verbose_logs:
@@ -1006,13 +1577,12 @@ async def message_handler(event, client):
             sender_id = getattr(event, "sender_id", None)
 
         # 命中缓存则直接使用显示名，并跳过昂贵的补全请求（get_entity / GetFullUserRequest）
-        import time as _time
         sender = None
         cached_hit = False
         if sender_id:
             cache_key = str(sender_id)
             cached = _SENDER_DISPLAY_CACHE.get(cache_key)
-            if cached and (_time.time() - float(cached.get("ts", 0))) < SENDER_CACHE_TTL_SEC:
+            if cached and (time.time() - float(cached.get("ts", 0))) < SENDER_CACHE_TTL_SEC:
                 sender = cached.get("sender") or str(sender_id)
                 cached_hit = True
                 if verbose_logs:
@@ -1020,12 +1590,10 @@ async def message_handler(event, client):
 
         # 如果缺少姓名信息且有 sender_id，再尝试拉取完整实体以补全 first_name/last_name（仅在未命中缓存时）
         if (not cached_hit) and sender_id and (not sender_entity or (not getattr(sender_entity, "first_name", None) and not getattr(sender_entity, "last_name", None))):
-            try:
-                detailed_entity = await client.get_entity(sender_id)
-                sender_entity = sender_entity or detailed_entity
-            except Exception:
-                # 补全失败时忽略，后续仍会使用已有的 username / id
-                detailed_entity = None
+            # single-flight：同一 sender 的并发查找共享一次 RPC，失败走负缓存
+            detailed_entity = await _single_flight(
+                ("entity", sender_id), lambda: client.get_entity(sender_id))
+            sender_entity = sender_entity or detailed_entity
         else:
             detailed_entity = None
 
@@ -1047,11 +1615,14 @@ async def message_handler(event, client):
             try:
                 from_id = getattr(event.message, "from_id", None) if hasattr(event, "message") else None
                 if from_id:
-                    from_entity = await client.get_entity(from_id)
-                    first_name = getattr(from_entity, "first_name", None) or first_name
-                    last_name = getattr(from_entity, "last_name", None) or last_name
-                    username = username or getattr(from_entity, "username", None)
-                    sender_title = sender_title or getattr(from_entity, "title", None)
+                    # from_id 是 Peer 对象，用 str 形式做去重 key
+                    from_entity = await _single_flight(
+                        ("entity", str(from_id)), lambda: client.get_entity(from_id))
+                    if from_entity:
+                        first_name = getattr(from_entity, "first_name", None) or first_name
+                        last_name = getattr(from_entity, "last_name", None) or last_name
+                        username = username or getattr(from_entity, "username", None)
+                        sender_title = sender_title or getattr(from_entity, "title", None)
             except Exception:
                 pass
 
@@ -1059,7 +1630,8 @@ async def message_handler(event, client):
         if (not cached_hit) and sender_id and not first_name and not last_name:
             try:
                 from telethon.tl.functions.users import GetFullUserRequest
-                full = await client(GetFullUserRequest(sender_id))
+                full = await _single_flight(
+                    ("full_user", sender_id), lambda: client(GetFullUserRequest(sender_id)))
                 if full and full.user:
                     first_name = getattr(full.user, "first_name", None) or first_name
                     last_name = getattr(full.user, "last_name", None) or last_name
@@ -1078,7 +1650,7 @@ async def message_handler(event, client):
                 sender = sender_title
             elif username:
                 sender = f"@{username}"
-            elif sender_id and str(sender_id) == str(getattr(chat, "id", "")) and channel_name and channel_name != "Unknown":
+            elif sender_id and str(sender_id) == channel_id and channel_name and channel_name != "Unknown":
                 sender = channel_name
             elif sender_id:
                 sender = str(sender_id)
@@ -1089,93 +1661,133 @@ async def message_handler(event, client):
             sender = sender or (str(sender_id) if sender_id else channel_name)
 
         # 写入缓存（只缓存有 sender_id 的情况）
+        # 已有条目就原地更新：换成新 dict 会把记忆化的 triggers 集合一起
+        # 丢掉，下游 AI 触发块每条消息都得重建，记忆化就白做了
         if sender_id and not re.fullmatch(r"-?\d+", str(sender or "").strip()):
-            _SENDER_DISPLAY_CACHE[str(sender_id)] = {"sender": sender, "ts": _time.time()}
+            entry = _SENDER_DISPLAY_CACHE.get(str(sender_id))
+            if entry is not None:
+                if entry.get("sender") != sender:
+                    # 显示名变了，基于它构建的触发标识集合作废
+                    entry.pop("triggers", None)
+                entry["sender"] = sender
+                entry["ts"] = time.time()
+            else:
+                _cache_put(_SENDER_DISPLAY_CACHE, str(sender_id), {"sender": sender, "ts": time.time()})
         elif sender_id:
             _SENDER_DISPLAY_CACHE.pop(str(sender_id), None)
 
         # 记录发件人解析详情（默认只在 verbose_logs 时输出）
         if verbose_logs:
-            logger.info("🔍 [发件人解析] sender_id=%s username=%s first_name=%s last_name=%s => sender=%s",
+            logger.debug("🔍 [发件人解析] sender_id=%s username=%s first_name=%s last_name=%s => sender=%s",
                         sender_id, username, first_name, last_name, sender)
 
-        # ai trigger users normalize
-        ai_analysis_config = config.get("ai_analysis", {})
-        ai_trigger_enabled = ai_analysis_config.get("ai_trigger_enabled", False)
-        ai_trigger_users = ai_analysis_config.get("ai_trigger_users", []) or []
-        if isinstance(ai_trigger_users, str):
-            ai_trigger_users = [u.strip() for u in ai_trigger_users.splitlines() if u.strip()]
-
-        # 调试日志：显示AI触发配置状态
-        if ai_trigger_enabled:
-            logger.info("🔍 [AI触发] 功能已启用，触发用户列表: %s", ai_trigger_users)
-        else:
-            logger.debug("🔍 [AI触发] 功能未启用")
-
+        # ai trigger：开关和触发用户集合都已在配置加载时预计算，
+        # 功能关闭（多数部署的常态）时这里整块零成本跳过
         is_trigger_user = False
-        if ai_trigger_enabled and ai_trigger_users and sender_id:
-            full_name = None
-            if sender_entity:
-                first_name = getattr(sender_entity, "first_name", None)
-                last_name = getattr(sender_entity, "last_name", None)
-                full_name = " ".join([n for n in [first_name, last_name] if n]) if (first_name or last_name) else None
-
-            sender_triggers = [
-                str(sender_id),
-                f"@{getattr(sender_entity, 'username', '')}" if sender_entity and getattr(sender_entity, "username", None) else None,
-                full_name,
-                sender
-            ]
-            sender_triggers = [str(s).strip() for s in sender_triggers if s]
-            
-            # 规范化触发用户列表（去除空白）
-            normalized_trigger_users = [str(u).strip() for u in ai_trigger_users]
-            
-            # 检查是否匹配（支持大小写不敏感匹配）
-            for trigger in normalized_trigger_users:
-                for sender_trigger in sender_triggers:
-                    if trigger.lower() == sender_trigger.lower() or trigger == sender_trigger:
-                        is_trigger_user = True
-                        logger.info("✅ 检测到触发用户匹配: %s (触发列表: %s, 发送者: %s)", trigger, normalized_trigger_users, sender_triggers)
-                        break
-                if is_trigger_user:
-                    break
+        if AI_TRIGGER_ENABLED and AI_TRIGGER_USERS_LC and sender_id:
+            # 触发标识集合按 sender 记忆化：同一用户连续发消息时直接取缓存，
+            # 不再每条重复 strip/lower/建集合
+            cached_meta = _SENDER_DISPLAY_CACHE.get(str(sender_id))
+            sender_triggers = cached_meta.get("triggers") if cached_meta else None
+            if sender_triggers is None:
+                # 复用上面发件人解析已得到的 username/full_name，不再重复 getattr/join
+                sender_triggers = frozenset(
+                    str(s).strip().casefold()
+                    for s in (str(sender_id), f"@{username}" if username else None, full_name, sender)
+                    if s
+                )
+                if cached_meta is not None:
+                    cached_meta["triggers"] = sender_triggers
+            matched_triggers = AI_TRIGGER_USERS_LC.intersection(sender_triggers)
+            if matched_triggers:
+                is_trigger_user = True
+                logger.info("✅ 检测到触发用户匹配: %s (发送者: %s)", sorted(matched_triggers), sorted(sender_triggers))
 
         # keyword checks
         keywords_list = config.get("keywords") or []
         alert_keywords_list = config.get("alert_keywords") or []
         if verbose_logs:
-            logger.info("🔍 [消息处理] 频道: %s, 发送者: %s, 消息长度: %d", channel_name, sender, len(text))
+            logger.debug("🔍 [消息处理] 频道: %s, 发送者: %s, 消息长度: %d", channel_name, sender, len(text))
         
         matched_keywords = []
-        # 检查监控关键词
-        # 使用预计算的 KEYWORDS_LC，避免每条消息重复 lower + 遍历转换
-        if KEYWORDS_LC:
-            for idx, k_lc in enumerate(KEYWORDS_LC):
-                if k_lc and k_lc in text_lc:
-                    # 尽量返回原始关键词（同下标），兜底返回 lower 版本
-                    try:
-                        matched_keywords.append((keywords_list[idx] if idx < len(keywords_list) else k_lc))
-                    except Exception:
-                        matched_keywords.append(k_lc)
-
-        # alert keywords (first-match)
         alert_keyword = None
-        if ALERT_KEYWORDS_LC:
-            for idx, kw_lc in enumerate(ALERT_KEYWORDS_LC):
-                if kw_lc and kw_lc in text_lc:
-                    alert_keyword = (alert_keywords_list[idx] if idx < len(alert_keywords_list) else kw_lc)
-                    if alert_keyword not in matched_keywords:
-                        matched_keywords.append(alert_keyword)
-                    break
+        hs_scanned = False
+        if KEYWORD_HS is not None:
+            # Hyperscan：全部关键词编译成一个 DFA，一次 SIMD 扫描拿到命中 id
+            hs_db, hs_pairs = KEYWORD_HS
+            hit_ids = set()
+            try:
+                hs_db.scan(text_lc.encode("utf-8", "ignore"),
+                           match_event_handler=lambda pat_id, f, t, flags, ctx: hit_ids.add(pat_id))
+                hs_scanned = True
+            except Exception as e:
+                logger.debug("Hyperscan 扫描失败，回退逐词匹配: %s", e)
+            if hs_scanned:
+                for pat_id in sorted(hit_ids):
+                    monitor_kw, alert_kw = hs_pairs[pat_id]
+                    if monitor_kw is not None:
+                        matched_keywords.append(monitor_kw)
+                    if alert_kw is not None and alert_keyword is None:
+                        alert_keyword = alert_kw
+                        if alert_kw not in matched_keywords:
+                            matched_keywords.append(alert_kw)
+        if hs_scanned:
+            pass
+        elif KEYWORD_AC is not None:
+            # Aho-Corasick：一次线性扫描同时找出全部监控/告警关键词命中
+            seen = set()
+            for _, (monitor_kw, alert_kw) in KEYWORD_AC.iter(text_lc):
+                key = monitor_kw or alert_kw
+                if key in seen:
+                    continue
+                seen.add(key)
+                if monitor_kw is not None:
+                    matched_keywords.append(monitor_kw)
+                if alert_kw is not None and alert_keyword is None:
+                    alert_keyword = alert_kw
+                    if alert_kw not in matched_keywords:
+                        matched_keywords.append(alert_kw)
+        else:
+            # 回退路径：逐词 in 检查（使用预计算的 KEYWORDS_LC，避免每条消息重复 lower）
+            if KEYWORDS_LC:
+                for idx, k_lc in enumerate(KEYWORDS_LC):
+                    if k_lc and k_lc in text_lc:
+                        # 尽量返回原始关键词（同下标），兜底返回 lower 版本
+                        try:
+                            matched_keywords.append((keywords_list[idx] if idx < len(keywords_list) else k_lc))
+                        except Exception:
+                            matched_keywords.append(k_lc)
+
+            # alert keywords (first-match)
+            if ALERT_KEYWORDS_LC:
+                for idx, kw_lc in enumerate(ALERT_KEYWORDS_LC):
+                    if kw_lc and kw_lc in text_lc:
+                        alert_keyword = (alert_keywords_list[idx] if idx < len(alert_keywords_list) else kw_lc)
+                        if alert_keyword not in matched_keywords:
+                            matched_keywords.append(alert_keyword)
+                        break
 
         # compiled regex (precompiled at config load)
+        # 合并后的大正则先做一次快速扫描；只有命中时才逐个模式定位是哪一条
         if not alert_keyword and COMPILED_ALERT_REGEX:
-            for pattern in COMPILED_ALERT_REGEX:
-                if pattern.search(text):
-                    alert_keyword = pattern.pattern
-                    matched_keywords.append(f"regex:{pattern.pattern}")
-                    break
+            # 字面量预检：每条模式都提取到必现字面量、且没有任何一个出现在
+            # 文本里时，可以直接断定全部不命中，连合并正则都不用跑
+            lits = COMPILED_ALERT_REGEX_LITERALS
+            literal_miss = (
+                len(lits) == len(COMPILED_ALERT_REGEX)
+                and all(l is not None and l not in text_lc for l in lits)
+            )
+            if not literal_miss and (
+                    COMPILED_ALERT_REGEX_UNION is None or COMPILED_ALERT_REGEX_UNION.search(text_lc)):
+                for idx, pattern in enumerate(COMPILED_ALERT_REGEX):
+                    if idx < len(lits):
+                        lit = lits[idx]
+                        if lit is not None and lit not in text_lc:
+                            continue
+                    if pattern.search(text_lc):
+                        alert_keyword = pattern.pattern
+                        matched_keywords.append(f"regex:{pattern.pattern}")
+                        break
 
         # save log if needed (async)
         if matched_keywords:
@@ -1184,7 +1796,11 @@ async def message_handler(event, client):
         if matched_keywords or log_all:
             log_id = await save_log_async(
                 channel_name, channel_id, sender, text, matched_keywords or [], event.id,
-                channel_username, channel_type, topic_id or "", topic_title or "", sender_id or ""
+                channel_username, channel_type, topic_id or "", topic_title or "", sender_id or "",
+                when=message_received_time,
+                # AI 触发的消息必须先确认落库：后端 analyze-now 收到请求
+                # 就会按 log_id findById，批量窗口内的文档它查不到
+                ensure_persisted=is_trigger_user
             )
             if matched_keywords:
                 logger.info("监控触发 | %s | %s", channel_name, matched_keywords)
@@ -1192,23 +1808,28 @@ async def message_handler(event, client):
                 logger.info("已记录消息（全量）| %s", channel_name)
 
             # 通知后端有新消息（触发SSE推送）
+            # notify_new_message_async 只是把 payload 追加进批量缓冲（真正的
+            # HTTP 发送在后台 flush 任务里），直接 await 即可，
+            # 不必每条消息再分配一个 Task
             if log_id:
-                asyncio.create_task(notify_new_message_async(
-                    log_id, channel_name, channel_id, sender, text, 
+                await notify_new_message_async(
+                    log_id, channel_name, channel_id, sender, text,
                     matched_keywords or [], bool(matched_keywords),
-                    channel_username, channel_type, topic_id or "", topic_title or "", sender_id or ""
-                ))
+                    channel_username, channel_type, topic_id or "", topic_title or "", sender_id or "",
+                    when=message_received_time
+                )
 
             # trigger AI analysis (async, limited)
             if is_trigger_user and log_id:
-                # schedule but don't await; concurrency controlled inside function
-                asyncio.create_task(trigger_ai_analysis_async(sender_id, client, log_id))
+                # 入有界队列交给固定 worker 池，并发由 AI_CONCURRENCY 限定
+                enqueue_ai_analysis(sender_id, client, log_id)
 
             # send alert (async)
             # 告警发送统一通过后端API处理，包括Telegram、邮件、Webhook等
             if alert_keyword:
                 logger.info("🔔 [告警触发] 关键词: %s (频道: %s, 发送者: %s)", alert_keyword, channel_name, sender)
-                asyncio.create_task(send_alert_async(alert_keyword, text, sender, channel_name, channel_id, event.id))
+                # 入有界队列交给固定 worker 池，突发时不再每条告警堆一个 task
+                enqueue_alert(alert_keyword, text, sender, channel_name, channel_id, event.id)
     except Exception:
         logger.exception("处理消息失败")
     # 移除频繁的CPU监控调用，避免每条消息都触发CPU检查导致峰值
@@ -1222,18 +1843,52 @@ async def main():
 
     global http_session
 
+    # 在运行中的事件循环上注册退出信号（容器里 docker stop 发 SIGTERM）
+    loop = asyncio.get_running_loop()
+    for s in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(s, functools.partial(_signal_handler, s))
+
     # 自动建立 Mongo 索引（如果不存在）
     ensure_indexes()
 
     # create aiohttp session (需要先创建，才能获取用户配置)
-    http_session = aiohttp.ClientSession()
+    # 显式配置连接池：keep-alive 拉长让到后端的 TCP 连接在两次调用间复用，
+    # DNS 结果缓存 5 分钟；每条消息的通知/告警/AI 调用不再反复付建连成本
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=32,
+        keepalive_timeout=75,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True,
+    )
+    # 内部 API 调用不需要 cookie/重定向/gzip：DummyCookieJar 省掉每请求的
+    # cookie 解析与锁；不带 Accept-Encoding（也不自动解压），后端就不会压缩；
+    # 不发 User-Agent 少一个请求头
+    http_session = aiohttp.ClientSession(
+        connector=connector,
+        json_serialize=_json_dumps,
+        cookie_jar=aiohttp.DummyCookieJar(),
+        auto_decompress=False,
+        skip_auto_headers=frozenset({"User-Agent", "Accept-Encoding"}),
+    )
 
     # start message-notify batch worker
     notify_worker = asyncio.create_task(message_notify_batch_worker())
 
+    # start log batch writer (批量 insert_many 代替逐条 insert_one)
+    log_writer = asyncio.create_task(log_batch_writer_task())
+
+    # start alert worker pool（固定并发消费有界队列）
+    alert_workers = [asyncio.create_task(alert_worker_task())
+                     for _ in range(ALERT_CONCURRENCY)]
+
+    # start AI analysis worker pool
+    ai_workers = [asyncio.create_task(ai_worker_task())
+                  for _ in range(AI_CONCURRENCY)]
+
     # 首先加载配置文件，检查是否有 user_id
     await asyncio.get_event_loop().run_in_executor(None, load_config_sync)
-    cfg = CONFIG_CACHE or default_config()
+    cfg = CONFIG_CACHE or _DEFAULT_CONFIG
     
     # 优先从配置文件读取 user_id，如果没有则使用环境变量
     active_user_id = cfg.get("user_id") or USER_ID
@@ -1311,7 +1966,7 @@ async def main():
                 
                 # 重新加载配置
                 await asyncio.get_event_loop().run_in_executor(None, load_config_sync)
-                cfg = CONFIG_CACHE or default_config()
+                cfg = CONFIG_CACHE or _DEFAULT_CONFIG
                 
                 # 检查是否已配置 API_ID/API_HASH
                 check_api_id = cfg.get("telegram", {}).get("api_id", 0) or 0
@@ -1321,7 +1976,6 @@ async def main():
                     logger.info("✅ 检测到 API_ID/API_HASH 已配置，准备重新启动...")
                     logger.info("📱 API_ID: %s", check_api_id)
                     # 正常退出，让 Docker 重启容器（restart: unless-stopped 会自动重启）
-                    import sys
                     sys.exit(0)
             except KeyboardInterrupt:
                 # 处理 Ctrl+C
@@ -1351,106 +2005,73 @@ async def main():
         session_file = os.path.join(SESSION_BASE_DIR, session_base_name)
         logger.info("使用 Session 文件: %s (SESSION_PREFIX: %s, USER_ID: %s)", session_file, SESSION_PREFIX, active_user_id or "未设置")
         client = TelegramClient(session_file, cfg_api_id, cfg_api_hash)
+        _tune_session_db(client)
     
     # 检查 session 文件是否存在（如果使用文件 session）
+    # 探测只做一次（单次 stat + 单次读文件头），结果贯穿后面所有检查点
+    session_info = SessionInfo()
     if session_file and not SESSION_STRING:
         # Telethon 使用 .session 扩展名
         # 如果传入路径是 /app/session/telegram_xxx，实际文件是 /app/session/telegram_xxx.session
         session_path_with_ext = f"{session_file}.session"
-        
-        # 详细日志：检查文件路径和存在性
-        logger.info("🔍 [Session 检查] 开始检查 session 文件...")
-        logger.info("🔍 [Session 检查] 基础路径: %s", session_file)
-        logger.info("🔍 [Session 检查] 完整路径（带扩展名）: %s", session_path_with_ext)
-        logger.info("🔍 [Session 检查] 基础路径存在: %s", os.path.exists(session_file))
-        logger.info("🔍 [Session 检查] 完整路径存在: %s", os.path.exists(session_path_with_ext))
-        
+
+        base_stat = _stat_or_none(session_file)
+        session_info = _probe_session(session_path_with_ext)
+
+        logger.debug("🔍 [Session 检查] 开始检查 session 文件...")
+        logger.debug("🔍 [Session 检查] 基础路径: %s", session_file)
+        logger.debug("🔍 [Session 检查] 完整路径（带扩展名）: %s", session_path_with_ext)
+        logger.debug("🔍 [Session 检查] 基础路径存在: %s", base_stat is not None)
+        logger.debug("🔍 [Session 检查] 完整路径存在: %s", session_info.exists)
+
         # 如果目录存在，列出目录内容
+        # scandir 一次批量读目录（getdents64），靠 d_type 区分文件/目录，
+        # 不像 listdir+逐项 stat 那样对每个条目多发一次系统调用
         session_dir = os.path.dirname(session_file)
-        if os.path.exists(session_dir):
-            logger.info("🔍 [Session 检查] Session 目录存在: %s", session_dir)
-            try:
-                dir_contents = os.listdir(session_dir)
-                logger.info("🔍 [Session 检查] 目录内容: %s", dir_contents)
-            except Exception as e:
-                logger.warning("🔍 [Session 检查] 无法列出目录内容: %s", e)
-        else:
+        try:
+            with os.scandir(session_dir) as it:
+                dir_contents = [(e.name, e.is_file(follow_symlinks=False)) for e in it]
+            logger.debug("🔍 [Session 检查] Session 目录存在: %s", session_dir)
+            logger.debug("🔍 [Session 检查] 目录内容: %s", dir_contents)
+        except FileNotFoundError:
             logger.warning("🔍 [Session 检查] Session 目录不存在: %s", session_dir)
-        
-        # 如果文件存在，检查文件权限和大小
-        if os.path.exists(session_path_with_ext):
-            try:
-                file_stat = os.stat(session_path_with_ext)
-                logger.info("🔍 [Session 检查] Session 文件大小: %d 字节", file_stat.st_size)
-                logger.info("🔍 [Session 检查] Session 文件权限: %o", file_stat.st_mode & 0o777)
-                logger.info("🔍 [Session 检查] Session 文件修改时间: %s", datetime.fromtimestamp(file_stat.st_mtime))
-            except Exception as e:
-                logger.warning("🔍 [Session 检查] 无法获取文件信息: %s", e)
-        
-        session_exists = os.path.exists(session_file) or os.path.exists(session_path_with_ext)
-        logger.info("🔍 [Session 检查] Session 文件存在性检查结果: %s", session_exists)
+        except Exception as e:
+            logger.warning("🔍 [Session 检查] 无法列出目录内容: %s", e)
+
+        # 如果文件存在，检查文件权限和大小（直接复用探测结果）
+        if session_info.exists:
+            logger.debug("🔍 [Session 检查] Session 文件大小: %d 字节", session_info.size)
+            logger.debug("🔍 [Session 检查] Session 文件权限: %o", session_info.mode & 0o777)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 [Session 检查] Session 文件修改时间: %s", datetime.fromtimestamp(session_info.mtime))
+
+        session_exists = base_stat is not None or session_info.exists
+        logger.debug("🔍 [Session 检查] Session 文件存在性检查结果: %s", session_exists)
         
         if not session_exists:
-            logger.error("")
-            logger.error("=" * 60)
-            logger.error("❌ Session 文件不存在")
-            logger.error("   预期路径: %s", session_file)
-            logger.error("   或: %s", session_path_with_ext)
-            logger.error("")
-            logger.error("📱 请先登录 Telegram 才能开始监控消息：")
-            logger.error("   1. 访问 Web 界面")
-            logger.error("   2. 进入 '设置' 标签")
-            logger.error("   3. 点击 'Telegram 首次登录' 按钮")
-            logger.error("   4. 按照提示完成登录（输入手机号和验证码）")
-            logger.error("   5. 登录成功后，重启 Telethon 服务：")
-            logger.error("      docker compose restart telethon")
-            logger.error("")
-            logger.error("⚠️  服务将退出，请完成登录后重启服务")
-            logger.error("=" * 60)
-            logger.error("")
-            # 使用 sys.exit(1) 非正常退出，触发 on-failure 重启策略
-            # 但限制重启次数，避免无限重启
-            import sys
-            sys.exit(1)
+            _exit_for_login(
+                "❌ Session 文件不存在",
+                f"   预期路径: {session_file}",
+                f"   或: {session_path_with_ext}",
+            )
 
     # 启动客户端（使用安全的方式避免交互式输入）
     try:
-        logger.info("🔍 [客户端启动] 开始连接 Telegram 客户端...")
-        logger.info("🔍 [客户端启动] Session 文件路径: %s", session_file if session_file else "StringSession")
-        logger.info("🔍 [客户端启动] API_ID: %s", cfg_api_id)
-        logger.info("🔍 [客户端启动] API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
+        logger.debug("🔍 [客户端启动] 开始连接 Telegram 客户端...")
+        logger.debug("🔍 [客户端启动] Session 文件路径: %s", session_file if session_file else "StringSession")
+        logger.debug("🔍 [客户端启动] API_ID: %s", cfg_api_id)
+        logger.debug("🔍 [客户端启动] API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
         
-        # 如果使用文件 session，在启动前等待一小段时间确保文件完全同步
-        if session_file and not SESSION_STRING:
-            import time
-            # 检查 session 文件是否存在，如果存在但刚修改过，等待一下
-            session_path_with_ext = f"{session_file}.session"
-            if os.path.exists(session_path_with_ext):
-                file_mtime = os.path.getmtime(session_path_with_ext)
-                time_since_modify = time.time() - file_mtime
-                # 如果文件在最近 15 秒内被修改，等待足够的时间确保完全同步
-                if time_since_modify < 15:
-                    wait_time = max(8.0, 15.0 - time_since_modify)
-                    logger.info("🔍 [客户端启动] Session 文件最近被修改（%.1f 秒前），等待 %.1f 秒确保完全同步...", time_since_modify, wait_time)
-                    await asyncio.sleep(wait_time)
-                    
-                    # 等待后再次检查文件大小，确保文件已完全写入
-                    if os.path.exists(session_path_with_ext):
-                        try:
-                            file_stat = os.stat(session_path_with_ext)
-                            # Session 文件应该至少 1KB（实际通常为几KB到几十KB）
-                            if file_stat.st_size < 1000:
-                                logger.warning("⚠️  [客户端启动] Session 文件过小（%d 字节），可能未完全写入，再等待 3 秒...", file_stat.st_size)
-                                await asyncio.sleep(3.0)
-                                # 再次检查
-                                file_stat2 = os.stat(session_path_with_ext)
-                                if file_stat2.st_size < 1000:
-                                    logger.error("❌ [客户端启动] Session 文件仍然过小（%d 字节），可能文件损坏", file_stat2.st_size)
-                        except Exception as stat_error:
-                            logger.warning("⚠️  [客户端启动] 无法检查文件大小: %s", str(stat_error))
+        # 文件 session 的落盘由写入端保证：login_helper.py 写完 session 后
+        # 会显式 fsync，这里不再用固定 8~15 秒的“等同步”停顿做代理，
+        # 容器重启后可立即连接；只对明显未写完的文件给出提示
+        if session_file and not SESSION_STRING and session_info.exists:
+            # Session 文件应该至少 1KB（实际通常为几KB到几十KB）
+            if session_info.size < 1000:
+                logger.warning("⚠️  [客户端启动] Session 文件过小（%d 字节），可能未完全写入", session_info.size)
         
         # 先连接（不触发交互式输入）
-        logger.info("🔍 [客户端启动] 正在连接到 Telegram 服务器...")
+        logger.debug("🔍 [客户端启动] 正在连接到 Telegram 服务器...")
         
         # 处理 Session 文件锁定问题（多个进程同时访问时可能发生）
         max_connect_retries = 5
@@ -1487,34 +2108,27 @@ async def main():
         if not connect_success:
             raise Exception("连接 Telegram 服务器失败：Session 文件被锁定")
         
-        # 在启动前，先尝试检查 session 文件是否可以读取
-        if session_file and not SESSION_STRING:
-            session_path_with_ext = f"{session_file}.session"
-            if os.path.exists(session_path_with_ext):
-                try:
-                    # 尝试读取 session 文件的前几个字节，验证文件是否可读
-                    with open(session_path_with_ext, 'rb') as f:
-                        header = f.read(16)
-                        logger.info("🔍 [授权检查] Session 文件可读，文件头: %s", header.hex() if header else "空文件")
-                        if len(header) == 0:
-                            logger.warning("⚠️  [授权检查] Session 文件为空！")
-                except Exception as read_error:
-                    logger.warning("⚠️  [授权检查] 无法读取 Session 文件: %s", str(read_error))
+        # 在启动前，先确认 session 文件可读（文件头已在启动探测时读过，直接复用）
+        if session_file and not SESSION_STRING and session_info.exists:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 [授权检查] Session 文件可读，文件头: %s", session_info.header.hex() if session_info.header else "空文件")
+            if len(session_info.header) == 0:
+                logger.warning("⚠️  [授权检查] Session 文件为空！")
         
         # 先检查授权状态，避免不必要的 start() 调用
-        logger.info("🔍 [授权检查] 检查用户是否已授权...")
-        logger.info("🔍 [授权检查] 使用的 API_ID: %s", cfg_api_id)
-        logger.info("🔍 [授权检查] 使用的 API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
-        logger.info("🔍 [授权检查] Session 文件路径: %s", session_file if session_file else "StringSession")
+        logger.debug("🔍 [授权检查] 检查用户是否已授权...")
+        logger.debug("🔍 [授权检查] 使用的 API_ID: %s", cfg_api_id)
+        logger.debug("🔍 [授权检查] 使用的 API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
+        logger.debug("🔍 [授权检查] Session 文件路径: %s", session_file if session_file else "StringSession")
         
-        # 详细记录 session 文件信息
+        # 详细记录 session 文件信息（复用启动时的探测结果）
         if session_file and not SESSION_STRING:
             session_path_with_ext = f"{session_file}.session"
-            logger.info("🔍 [授权检查] Session 文件完整路径: %s", session_path_with_ext)
-            if os.path.exists(session_path_with_ext):
-                file_stat = os.stat(session_path_with_ext)
-                logger.info("🔍 [授权检查] Session 文件大小: %d 字节", file_stat.st_size)
-                logger.info("🔍 [授权检查] Session 文件修改时间: %s", datetime.fromtimestamp(file_stat.st_mtime))
+            logger.debug("🔍 [授权检查] Session 文件完整路径: %s", session_path_with_ext)
+            if session_info.exists:
+                logger.debug("🔍 [授权检查] Session 文件大小: %d 字节", session_info.size)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🔍 [授权检查] Session 文件修改时间: %s", datetime.fromtimestamp(session_info.mtime))
             else:
                 logger.warning("⚠️  [授权检查] Session 文件不存在: %s", session_path_with_ext)
         
@@ -1522,55 +2136,75 @@ async def main():
         is_authorized = False
         try:
             is_authorized = await client.is_user_authorized()
-            logger.info("🔍 [授权检查] 授权状态: %s", is_authorized)
+            logger.debug("🔍 [授权检查] 授权状态: %s", is_authorized)
         except Exception as auth_check_ex:
             logger.warning("⚠️  [授权检查] 检查授权状态时出错: %s，将尝试启动客户端验证", str(auth_check_ex))
             # 如果检查授权状态失败，继续尝试启动客户端
         
         # 如果授权检查返回 False，尝试启动客户端验证（因为 is_user_authorized() 可能不准确）
         if not is_authorized:
-            logger.info("🔍 [授权检查] 授权状态为 False，尝试启动客户端验证 session 是否有效...")
+            logger.debug("🔍 [授权检查] 授权状态为 False，尝试启动客户端验证 session 是否有效...")
             
-            # 在启动前，检查 session 文件的完整性
-            if session_file and not SESSION_STRING:
-                session_path_with_ext = f"{session_file}.session"
-                if os.path.exists(session_path_with_ext):
-                    try:
-                        file_stat = os.stat(session_path_with_ext)
-                        logger.info("🔍 [授权检查] Session 文件大小: %d 字节", file_stat.st_size)
-                        if file_stat.st_size < 1000:
-                            logger.warning("⚠️  [授权检查] Session 文件过小（%d 字节），可能不完整", file_stat.st_size)
-                        # 尝试读取文件头验证文件格式
-                        with open(session_path_with_ext, 'rb') as f:
-                            header = f.read(16)
-                            if header.startswith(b'SQLite format 3'):
-                                logger.info("🔍 [授权检查] Session 文件格式正确（SQLite）")
-                            else:
-                                logger.warning("⚠️  [授权检查] Session 文件格式异常，文件头: %s", header.hex()[:32])
-                    except Exception as file_check_error:
-                        logger.warning("⚠️  [授权检查] 检查 session 文件时出错: %s", str(file_check_error))
+            # 在启动前，检查 session 文件的完整性（复用启动时的探测结果）
+            if session_file and not SESSION_STRING and session_info.exists:
+                logger.debug("🔍 [授权检查] Session 文件大小: %d 字节", session_info.size)
+                if session_info.size < 1000:
+                    logger.warning("⚠️  [授权检查] Session 文件过小（%d 字节），可能不完整", session_info.size)
+                if session_info.is_sqlite:
+                    logger.debug("🔍 [授权检查] Session 文件格式正确（SQLite）")
+                else:
+                    logger.warning("⚠️  [授权检查] Session 文件格式异常，文件头: %s", session_info.header.hex()[:32])
             
             # 尝试启动客户端，最多重试 2 次
             max_retries = 2
             retry_count = 0
             start_success = False
-            
+            last_error = None
+
             while retry_count < max_retries and not start_success:
                 try:
                     if retry_count > 0:
-                        logger.info("🔍 [授权检查] 重试启动客户端（第 %d 次）...", retry_count + 1)
-                        # 重新连接
-                        if client.is_connected():
-                            await client.disconnect()
-                        await asyncio.sleep(1)  # 等待 1 秒后重试
-                        await client.connect()
+                        logger.debug("🔍 [授权检查] 重试启动客户端（第 %d 次）...", retry_count + 1)
+                        await asyncio.sleep(_backoff_delay(retry_count))  # 指数退避后重试
+                        # 只有网络类失败才值得重建连接——断开重连要完整重走
+                        # MTProto 握手；其他错误保持现有连接直接重试 start()
+                        if isinstance(last_error, _TRANSIENT_ERRORS) or hasattr(last_error, 'code'):
+                            if client.is_connected():
+                                await client.disconnect()
+                            await client.connect()
+                        elif not client.is_connected():
+                            await client.connect()
                     
                     # 尝试启动客户端，如果成功说明 session 有效
                     await client.start()
                     logger.info("✅ [授权检查] 客户端启动成功，session 有效（is_user_authorized() 可能不准确）")
                     is_authorized = True
                     start_success = True
+                except EOFError as eof_error:
+                    # EOFError 表示尝试了交互式输入，session 本身无效，重试不会变好，
+                    # 直接短路退出（原来这个分支排在 except Exception 之后，永远走不到）
+                    last_error = eof_error
+                    logger.error("🔍 [授权检查] EOFError 详情: %s", str(eof_error))
+                    logger.error("🔍 [授权检查] Session 文件路径: %s", session_file if session_file else "StringSession")
+                    logger.error("🔍 [授权检查] API_ID: %s", cfg_api_id)
+                    logger.error("🔍 [授权检查] API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
+
+                    # 检查 session 文件是否存在且可读
+                    if session_file and not SESSION_STRING:
+                        session_path_with_ext = f"{session_file}.session"
+                        if _stat_or_none(session_path_with_ext) is not None:
+                            logger.error("🔍 [授权检查] Session 文件存在但无法使用，可能原因：")
+                            logger.error("   1. Session 文件是用不同的 API_ID/API_HASH 创建的")
+                            logger.error("   2. Session 文件内容损坏或不完整")
+                            logger.error("   3. Session 文件在写入时没有完全同步")
+                            logger.error("   建议：删除旧的 session 文件后重新登录")
+                        else:
+                            logger.error("🔍 [授权检查] Session 文件不存在: %s", session_path_with_ext)
+
+                    await client.disconnect()
+                    _exit_for_login("❌ Telegram 客户端未授权，Session 文件无效或不存在")
                 except Exception as rpc_error:
+                    last_error = rpc_error
                     # 检查是否是 RPC 错误（AUTH_KEY_UNREGISTERED，错误代码 401）
                     # Telethon 的 RPC 错误通常有 code 和 message 属性
                     if hasattr(rpc_error, 'code') and rpc_error.code == 401:
@@ -1582,12 +2216,12 @@ async def main():
                         logger.error("🔍 [授权检查] API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
                         
                         # 检查 session 文件是否存在且可读
+                        # 单次 stat 同时拿到存在性和 mtime，避免 exists+getmtime 的 TOCTOU 竞态
                         if session_file and not SESSION_STRING:
                             session_path_with_ext = f"{session_file}.session"
-                            if os.path.exists(session_path_with_ext):
-                                import time
-                                file_mtime = os.path.getmtime(session_path_with_ext)
-                                time_since_modify = time.time() - file_mtime
+                            st = _stat_or_none(session_path_with_ext)
+                            if st is not None:
+                                time_since_modify = time.time() - st.st_mtime
                                 
                                 # 如果文件在最近 15 秒内被修改，可能是文件还没完全同步，等待一下
                                 if time_since_modify < 15:
@@ -1621,104 +2255,34 @@ async def main():
                         
                         if not is_authorized:
                             await client.disconnect()
-                            logger.error("")
-                            logger.error("=" * 60)
-                            logger.error("❌ Telegram 客户端未授权，Session 文件中的认证密钥无效")
-                            logger.error("")
-                            logger.error("📱 请先登录 Telegram 才能开始监控消息：")
-                            logger.error("   1. 访问 Web 界面")
-                            logger.error("   2. 进入 '设置' 标签")
-                            logger.error("   3. 点击 'Telegram 首次登录' 按钮")
-                            logger.error("   4. 按照提示完成登录（输入手机号和验证码）")
-                            logger.error("   5. 登录成功后，重启 Telethon 服务：")
-                            logger.error("      docker compose restart telethon")
-                            logger.error("")
-                            logger.error("⚠️  服务将退出，请完成登录后重启服务")
-                            logger.error("=" * 60)
-                            logger.error("")
-                            import sys
-                            sys.exit(1)
-                    else:
+                            _exit_for_login("❌ Telegram 客户端未授权，Session 文件中的认证密钥无效")
+                    elif hasattr(rpc_error, 'code'):
                         # 其他 RpcError，可能是网络问题或其他错误
                         retry_count += 1
                         if retry_count >= max_retries:
                             logger.warning("⚠️  [授权检查] RpcError: %s，但继续尝试检查授权状态", str(rpc_error))
                         else:
                             logger.warning("⚠️  [授权检查] RpcError（第 %d 次尝试）: %s，将重试...", retry_count, str(rpc_error))
-                except EOFError as eof_error:
-                    # EOFError 表示尝试了交互式输入，说明 session 无效
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        logger.error("🔍 [授权检查] EOFError 详情: %s", str(eof_error))
-                        logger.error("🔍 [授权检查] Session 文件路径: %s", session_file if session_file else "StringSession")
-                        logger.error("🔍 [授权检查] API_ID: %s", cfg_api_id)
-                        logger.error("🔍 [授权检查] API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
-                        
-                        # 检查 session 文件是否存在且可读
-                        if session_file and not SESSION_STRING:
-                            session_path_with_ext = f"{session_file}.session"
-                            if os.path.exists(session_path_with_ext):
-                                logger.error("🔍 [授权检查] Session 文件存在但无法使用，可能原因：")
-                                logger.error("   1. Session 文件是用不同的 API_ID/API_HASH 创建的")
-                                logger.error("   2. Session 文件内容损坏或不完整")
-                                logger.error("   3. Session 文件在写入时没有完全同步")
-                                logger.error("   建议：删除旧的 session 文件后重新登录")
-                            else:
-                                logger.error("🔍 [授权检查] Session 文件不存在: %s", session_path_with_ext)
-                        
-                        await client.disconnect()
-                        logger.error("")
-                        logger.error("=" * 60)
-                        logger.error("❌ Telegram 客户端未授权，Session 文件无效或不存在")
-                        logger.error("")
-                        logger.error("📱 请先登录 Telegram 才能开始监控消息：")
-                        logger.error("   1. 访问 Web 界面")
-                        logger.error("   2. 进入 '设置' 标签")
-                        logger.error("   3. 点击 'Telegram 首次登录' 按钮")
-                        logger.error("   4. 按照提示完成登录（输入手机号和验证码）")
-                        logger.error("   5. 登录成功后，重启 Telethon 服务：")
-                        logger.error("      docker compose restart telethon")
-                        logger.error("")
-                        logger.error("⚠️  服务将退出，请完成登录后重启服务")
-                        logger.error("=" * 60)
-                        logger.error("")
-                        import sys
-                        sys.exit(1)
-                    else:
-                        logger.warning("⚠️  [授权检查] EOFError（第 %d 次尝试），将重试...", retry_count)
-                except Exception as start_error:
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        # 其他错误，可能是网络问题或其他错误
-                        logger.warning("⚠️  [授权检查] 启动客户端失败: %s，但继续尝试检查授权状态", str(start_error))
-                        # 再次检查授权状态
-                        try:
-                            is_authorized = await client.is_user_authorized()
-                            logger.info("🔍 [授权检查] 重新检查授权状态: %s", is_authorized)
-                        except Exception:
-                            pass
                     else:
-                        logger.warning("⚠️  [授权检查] 启动失败（第 %d 次尝试）: %s，将重试...", retry_count, str(start_error))
+                        retry_count += 1
+                        # 非瞬时性错误（不是网络/超时类）重试也不会变好，直接停止循环
+                        if not isinstance(rpc_error, _TRANSIENT_ERRORS):
+                            retry_count = max_retries
+                        if retry_count >= max_retries:
+                            # 其他错误，可能是网络问题或其他错误
+                            logger.warning("⚠️  [授权检查] 启动客户端失败: %s，但继续尝试检查授权状态", str(rpc_error))
+                            # 再次检查授权状态
+                            try:
+                                is_authorized = await client.is_user_authorized()
+                                logger.debug("🔍 [授权检查] 重新检查授权状态: %s", is_authorized)
+                            except Exception:
+                                pass
+                        else:
+                            logger.warning("⚠️  [授权检查] 启动失败（第 %d 次尝试）: %s，将重试...", retry_count, str(rpc_error))
         
         if not is_authorized:
             await client.disconnect()
-            logger.error("")
-            logger.error("=" * 60)
-            logger.error("❌ Telegram 客户端未授权，Session 文件无效或不存在")
-            logger.error("")
-            logger.error("📱 请先登录 Telegram 才能开始监控消息：")
-            logger.error("   1. 访问 Web 界面")
-            logger.error("   2. 进入 '设置' 标签")
-            logger.error("   3. 点击 'Telegram 首次登录' 按钮")
-            logger.error("   4. 按照提示完成登录（输入手机号和验证码）")
-            logger.error("   5. 登录成功后，重启 Telethon 服务：")
-            logger.error("      docker compose restart telethon")
-            logger.error("")
-            logger.error("⚠️  服务将退出，请完成登录后重启服务")
-            logger.error("=" * 60)
-            logger.error("")
-            import sys
-            sys.exit(1)
+            _exit_for_login("❌ Telegram 客户端未授权，Session 文件无效或不存在")
         
         # 如果已授权但还未启动，使用 start() 方法启动客户端
         if not client.is_connected():
@@ -1729,10 +2293,12 @@ async def main():
         
         # 尝试获取用户信息，如果成功说明已经启动
         # 添加重试逻辑处理 session 文件锁定问题
+        # 结果保留在 me 里，启动末尾的“已登录为”日志直接复用，不再发第二次 users.getUsers
         max_get_me_retries = 5
         get_me_retry_delay = 2.0
         get_me_success = False
-        
+        me = None
+
         for get_me_retry in range(max_get_me_retries):
             try:
                 me = await client.get_me()
@@ -1760,67 +2326,33 @@ async def main():
                         break
                 else:
                     # 其他错误，可能是客户端未启动
-                    logger.info("🔍 [授权检查] get_me 失败（非锁定错误）: %s，将尝试启动客户端", str(get_me_error))
+                    logger.debug("🔍 [授权检查] get_me 失败（非锁定错误）: %s，将尝试启动客户端", str(get_me_error))
                     break
         
         if not get_me_success:
             # 如果获取用户信息失败，说明需要启动客户端
-            logger.info("🔍 [授权检查] 客户端已连接但未启动，尝试启动客户端...")
+            logger.debug("🔍 [授权检查] 客户端已连接但未启动，尝试启动客户端...")
             try:
                 await client.start()
                 logger.info("✅ [授权检查] 客户端启动成功，session 有效")
                 client_started = True
             except EOFError as eof_error:
                 # EOFError 表示尝试了交互式输入，说明 session 无效
-                import traceback
                 logger.error("🔍 [授权检查] EOFError 详情: %s", str(eof_error))
                 logger.error("🔍 [授权检查] EOFError 堆栈: %s", traceback.format_exc())
                 await client.disconnect()
-                logger.error("")
-                logger.error("=" * 60)
-                logger.error("❌ Telegram 客户端未授权，Session 文件无效或不存在")
-                logger.error("")
-                logger.error("📱 请先登录 Telegram 才能开始监控消息：")
-                logger.error("   1. 访问 Web 界面")
-                logger.error("   2. 进入 '设置' 标签")
-                logger.error("   3. 点击 'Telegram 首次登录' 按钮")
-                logger.error("   4. 按照提示完成登录（输入手机号和验证码）")
-                logger.error("   5. 登录成功后，重启 Telethon 服务：")
-                logger.error("      docker compose restart telethon")
-                logger.error("")
-                logger.error("⚠️  服务将退出，请完成登录后重启服务")
-                logger.error("=" * 60)
-                logger.error("")
-                # 使用 sys.exit(1) 非正常退出，触发 on-failure 重启策略
-                import sys
-                sys.exit(1)
+                _exit_for_login("❌ Telegram 客户端未授权，Session 文件无效或不存在")
             except Exception as start_error:
                 # 其他异常，可能是网络问题或其他错误
                 # 尝试检查授权状态作为备用方案
                 logger.warning("⚠️  [授权检查] start() 失败: %s，尝试检查授权状态...", str(start_error))
                 try:
                     is_authorized = await client.is_user_authorized()
-                    logger.info("🔍 [授权检查] 授权状态: %s", is_authorized)
+                    logger.debug("🔍 [授权检查] 授权状态: %s", is_authorized)
                     
                     if not is_authorized:
                         await client.disconnect()
-                        logger.error("")
-                        logger.error("=" * 60)
-                        logger.error("❌ Telegram 客户端未授权，Session 文件无效或不存在")
-                        logger.error("")
-                        logger.error("📱 请先登录 Telegram 才能开始监控消息：")
-                        logger.error("   1. 访问 Web 界面")
-                        logger.error("   2. 进入 '设置' 标签")
-                        logger.error("   3. 点击 'Telegram 首次登录' 按钮")
-                        logger.error("   4. 按照提示完成登录（输入手机号和验证码）")
-                        logger.error("   5. 登录成功后，重启 Telethon 服务：")
-                        logger.error("      docker compose restart telethon")
-                        logger.error("")
-                        logger.error("⚠️  服务将退出，请完成登录后重启服务")
-                        logger.error("=" * 60)
-                        logger.error("")
-                        import sys
-                        sys.exit(1)
+                        _exit_for_login("❌ Telegram 客户端未授权，Session 文件无效或不存在")
                     else:
                         # 如果授权状态为 True，但 start() 失败，可能是其他问题
                         # 尝试重新连接并启动
@@ -1831,25 +2363,11 @@ async def main():
                 except Exception as auth_check_error:
                     # 检查授权状态也失败，说明 session 确实有问题
                     await client.disconnect()
-                    logger.error("")
-                    logger.error("=" * 60)
-                    logger.error("❌ 无法验证 Telegram 客户端授权状态")
-                    logger.error("🔍 [错误详情] start() 错误: %s", str(start_error))
-                    logger.error("🔍 [错误详情] 授权检查错误: %s", str(auth_check_error))
-                    logger.error("")
-                    logger.error("📱 请先登录 Telegram 才能开始监控消息：")
-                    logger.error("   1. 访问 Web 界面")
-                    logger.error("   2. 进入 '设置' 标签")
-                    logger.error("   3. 点击 'Telegram 首次登录' 按钮")
-                    logger.error("   4. 按照提示完成登录（输入手机号和验证码）")
-                    logger.error("   5. 登录成功后，重启 Telethon 服务：")
-                    logger.error("      docker compose restart telethon")
-                    logger.error("")
-                    logger.error("⚠️  服务将退出，请完成登录后重启服务")
-                    logger.error("=" * 60)
-                    logger.error("")
-                    import sys
-                    sys.exit(1)
+                    _exit_for_login(
+                        "❌ 无法验证 Telegram 客户端授权状态",
+                        f"🔍 [错误详情] start() 错误: {start_error}",
+                        f"🔍 [错误详情] 授权检查错误: {auth_check_error}",
+                    )
     except EOFError as e:
         # 如果遇到 EOFError，说明尝试了交互式输入（session 无效或不存在）
         logger.error("=" * 60)
@@ -1863,7 +2381,6 @@ async def main():
         logger.error("   4. 按照提示完成登录")
         logger.error("   5. 登录成功后，重启 Telethon 服务：docker compose restart telethon")
         logger.error("=" * 60)
-        import sys
         sys.exit(1)
     except Exception as e:
         logger.error("=" * 60)
@@ -1872,7 +2389,6 @@ async def main():
         logger.error("🔍 [错误详情] Session 文件路径: %s", session_file if session_file else "StringSession")
         logger.error("🔍 [错误详情] API_ID: %s", cfg_api_id)
         logger.error("🔍 [错误详情] API_HASH: %s", "已设置" if cfg_api_hash else "未设置")
-        import traceback
         logger.error("🔍 [错误详情] 完整堆栈:\n%s", traceback.format_exc())
         logger.error("📱 请先登录 Telegram 才能开始监控消息：")
         logger.error("   1. 访问 Web 界面")
@@ -1881,44 +2397,42 @@ async def main():
         logger.error("   4. 按照提示完成登录")
         logger.error("   5. 登录成功后，重启 Telethon 服务：docker compose restart telethon")
         logger.error("=" * 60)
-        import sys
         sys.exit(1)
     
     # 注册消息处理器
-    # 重要：设置 outgoing=False 只监控收到的消息，不监控自己发送的消息
-    # 这可以防止告警消息触发关键词匹配导致无限循环
-    client.add_event_handler(lambda e: message_handler(e, client), events.NewMessage(outgoing=False))
-    logger.info("✅ [事件注册] 已注册 NewMessage 事件处理器（仅监控收到的消息）")
-    
-    # 获取用户信息（添加重试逻辑处理 session 文件锁定）
-    max_get_me_retries = 5
-    get_me_retry_delay = 2.0
-    me = None
+    # 注册细节（outgoing=False / chats 预过滤 / 空文本过滤）见 _register_message_handler
+    _register_message_handler(client)
     
-    for get_me_retry in range(max_get_me_retries):
-        try:
-            me = await client.get_me()
-            logger.info("已登录为: %s (ID: %s)", getattr(me, "username", None) or getattr(me, "first_name", None), me.id)
-            break
-        except Exception as get_me_error:
-            error_msg = str(get_me_error)
-            # 检查是否是数据库锁定错误
-            if 'database is locked' in error_msg.lower() or 'OperationalError' in str(type(get_me_error)):
-                if get_me_retry < max_get_me_retries - 1:
-                    wait_time = get_me_retry_delay * (get_me_retry + 1)
-                    logger.warning("⚠️  [启动] Session 文件被锁定（get_me），等待 %.1f 秒后重试 (%d/%d)...", 
-                                 wait_time, get_me_retry + 1, max_get_me_retries)
-                    await asyncio.sleep(wait_time)
-                    continue
+    # 获取用户信息：授权检查阶段的 get_me 结果直接复用，
+    # 只有没拿到时才重新请求（省一次 users.getUsers 往返），并处理 session 文件锁定
+    if me is None:
+        max_get_me_retries = 5
+        get_me_retry_delay = 2.0
+
+        for get_me_retry in range(max_get_me_retries):
+            try:
+                me = await client.get_me()
+                break
+            except Exception as get_me_error:
+                error_msg = str(get_me_error)
+                # 检查是否是数据库锁定错误
+                if 'database is locked' in error_msg.lower() or 'OperationalError' in str(type(get_me_error)):
+                    if get_me_retry < max_get_me_retries - 1:
+                        wait_time = get_me_retry_delay * (get_me_retry + 1)
+                        logger.warning("⚠️  [启动] Session 文件被锁定（get_me），等待 %.1f 秒后重试 (%d/%d)...",
+                                     wait_time, get_me_retry + 1, max_get_me_retries)
+                        await asyncio.sleep(wait_time)
+                        continue
+                    else:
+                        logger.error("❌ [启动] Session 文件持续被锁定（get_me），已重试 %d 次仍失败", max_get_me_retries)
+                        raise
                 else:
-                    logger.error("❌ [启动] Session 文件持续被锁定（get_me），已重试 %d 次仍失败", max_get_me_retries)
+                    # 其他错误直接抛出
                     raise
-            else:
-                # 其他错误直接抛出
-                raise
-    
+
     if not me:
         raise Exception("无法获取用户信息：Session 文件被锁定")
+    logger.info("已登录为: %s (ID: %s)", getattr(me, "username", None) or getattr(me, "first_name", None), me.id)
     
     # 诊断：列出当前加入的对话（用于调试）
     try:
@@ -1941,9 +2455,11 @@ async def main():
     app = web.Application()
     app.router.add_post('/api/internal/telegram/send', handle_send_telegram)
     app.router.add_post('/api/internal/config/reload', handle_config_reload)
-    runner = web.AppRunner(app)
+    # access_log=None：内部接口不需要每请求一行访问日志（省格式化 + stderr 写入）；
+    # keepalive_timeout 调长让后端复用连接；reuse_port + backlog 应对突发请求
+    runner = web.AppRunner(app, access_log=None, keepalive_timeout=75)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', 8888)
+    site = web.TCPSite(runner, '0.0.0.0', 8888, reuse_port=True, backlog=256)
     await site.start()
     logger.info("📡 HTTP服务器已启动，监听端口 8888，用于接收Telegram消息发送请求")
 
@@ -1959,13 +2475,21 @@ async def main():
         SHUTDOWN.set()
         reloader.cancel()
         notify_worker.cancel()
+        # 日志批量写任务被取消时会先 flush 掉队列里剩余的文档
+        log_writer.cancel()
+        for w in alert_workers:
+            w.cancel()
+        for w in ai_workers:
+            w.cancel()
         # best-effort flush remaining notifications
         try:
             await flush_message_notify_batch()
         except Exception:
             pass
-        await runner.cleanup()
-        await http_session.close()
+        # runner 与 http_session 的关闭互不依赖，并发执行缩短容器重启时间
+        await asyncio.gather(runner.cleanup(), http_session.close(), return_exceptions=True)
+        # 给被 cancel 的后台任务一次被调度的机会，让取消真正生效
+        await asyncio.wait({reloader, notify_worker, log_writer, *alert_workers, *ai_workers}, timeout=1.0)
 
 
 # graceful shutdown
@@ -1975,15 +2499,15 @@ def _signal_handler(signame):
 
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    for s in (signal.SIGINT, signal.SIGTERM):
-        try:
-            loop.add_signal_handler(s, lambda s=s: _signal_handler(s))
-        except NotImplementedError:
-            # Windows 上 loop.add_signal_handler 可能不可用
-            pass
+    # asyncio.run 新建并妥善关闭事件循环（含异步生成器清理），
+    # 不再使用已废弃的 get_event_loop()/run_until_complete
+    if uvloop is not None:
+        uvloop.install()
+        logger.info("⚡ 已启用 uvloop 事件循环")
     try:
-        loop.run_until_complete(main())
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
     except Exception:
         logger.exception("服务异常退出")
     finally: